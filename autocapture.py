@@ -0,0 +1,183 @@
+import threading
+import time
+import cv2
+import numpy as np
+from calibration import canonical_corners, view_sharpness
+
+DETECT_WIDTH = 640  # 粗检测统一缩放到该宽度
+SCALE_BINS = (0.25, 0.45)  # 棋盘格占画面比例 (边长) 的分档: 远 / 中 / 近
+TILT_THRESHOLD = 0.12  # 对边长度比的对数超过该值视为倾斜
+
+
+def board_pose(corners, pattern_size, image_size):
+    """由角点估计棋盘格在画面中的 (中心 x, 中心 y, 尺度, 水平倾斜, 竖直倾斜)
+
+    中心和尺度都已按画面尺寸归一化；倾斜为对边长度比的对数，正负表示方向。
+    """
+    # 检测的起始角点不固定 (可能反转 180° 或旋转 90°)，先统一方向，否则倾斜的正负会随之翻转
+    pts = canonical_corners(corners, pattern_size).reshape(pattern_size[1], pattern_size[0], 2)
+    tl, tr, bl, br = pts[0, 0], pts[0, -1], pts[-1, 0], pts[-1, -1]
+    w, h = image_size
+    cx, cy = float(pts[..., 0].mean()) / w, float(pts[..., 1].mean()) / h
+
+    area = cv2.contourArea(np.array([tl, tr, br, bl], np.float32))
+    scale = float(np.sqrt(area / float(w * h)))
+
+    def length(a, b):
+        return max(float(np.linalg.norm(a - b)), 1e-6)
+
+    # 透视下离相机近的一边更长: 左右边之比反映绕竖轴的旋转，上下边之比反映绕横轴的旋转
+    tilt_x = float(np.log(length(tl, bl) / length(tr, br)))
+    tilt_y = float(np.log(length(tl, tr) / length(bl, br)))
+    return cx, cy, scale, tilt_x, tilt_y
+
+
+class Coverage(object):
+    """记录已采集视角在位置、尺度、倾斜三个维度上的分布"""
+
+    TILT_NAMES = ('正对', '左倾', '右倾', '上倾', '下倾')
+
+    def __init__(self, grid=(3, 3), per_cell=1, per_scale=2, per_tilt=2, min_views=15):
+        super(Coverage, self).__init__()
+        self.grid = grid
+        self.per_cell = per_cell
+        self.per_scale = per_scale
+        self.per_tilt = per_tilt
+        self.min_views = min_views
+        self.cells = np.zeros((grid[1], grid[0]), np.int32)
+        self.scales = np.zeros(len(SCALE_BINS) + 1, np.int32)
+        self.tilts = np.zeros(len(self.TILT_NAMES), np.int32)
+        self.total = 0
+
+    def bins(self, pose):
+        cx, cy, scale, tilt_x, tilt_y = pose
+        col = min(self.grid[0] - 1, max(0, int(cx * self.grid[0])))
+        row = min(self.grid[1] - 1, max(0, int(cy * self.grid[1])))
+        scale_bin = int(np.searchsorted(SCALE_BINS, scale))
+        if max(abs(tilt_x), abs(tilt_y)) < TILT_THRESHOLD:
+            tilt_bin = 0
+        elif abs(tilt_x) >= abs(tilt_y):
+            tilt_bin = 1 if tilt_x > 0 else 2
+        else:
+            tilt_bin = 3 if tilt_y > 0 else 4
+        return (row, col), scale_bin, tilt_bin
+
+    def is_needed(self, pose):
+        """该视角是否落在尚未覆盖够的区域"""
+        cell, scale_bin, tilt_bin = self.bins(pose)
+        return (self.cells[cell] < self.per_cell or self.scales[scale_bin] < self.per_scale
+                or self.tilts[tilt_bin] < self.per_tilt)
+
+    def add(self, pose):
+        cell, scale_bin, tilt_bin = self.bins(pose)
+        self.cells[cell] += 1
+        self.scales[scale_bin] += 1
+        self.tilts[tilt_bin] += 1
+        self.total += 1
+
+    def is_complete(self):
+        return (self.total >= self.min_views and (self.cells >= self.per_cell).all()
+                and (self.scales >= self.per_scale).all() and (self.tilts >= self.per_tilt).all())
+
+    def summary(self):
+        cells = int((self.cells >= self.per_cell).sum())
+        missing = [self.TILT_NAMES[i] for i in range(len(self.tilts)) if self.tilts[i] < self.per_tilt]
+        text = "已采 {} 张, 位置 {}/{}, 尺度 {}".format(
+            self.total, cells, self.cells.size, "/".join(str(int(n)) for n in self.scales))
+        if missing:
+            text += ", 缺少: " + "、".join(missing)
+        return text
+
+
+class AutoCaptureWorker(threading.Thread):
+    """自动采集: 在缩小图上快速检测棋盘格，画面清晰、稳定且位于未覆盖区域时保存当前帧
+
+    on_capture(frame) 和 on_progress(text, done) 都在工作线程中调用。
+    """
+
+    def __init__(self, vs, pattern_size, on_capture, on_progress=None, coverage=None,
+                 min_sharpness=40.0, stable_px=1.5, stable_frames=3, min_interval=1.0, interval=0.05):
+        super().__init__()
+        self.daemon = True
+        self.vs = vs
+        self.pattern_size = pattern_size
+        self.on_capture = on_capture
+        self.on_progress = on_progress
+        self.coverage = coverage or Coverage()
+        self.min_sharpness = min_sharpness  # 棋盘区域拉普拉斯方差下限
+        self.stable_px = stable_px  # 相邻两帧角点平均位移上限 (检测图像素)
+        self.stable_frames = stable_frames
+        self.min_interval = min_interval  # 两次保存之间的最短间隔 (秒)
+        self.interval = interval
+        self.stopped = False
+        self._prev = None
+        self._stable = 0
+        self._last_capture = float('-inf')  # time.monotonic()，不受系统时间调整影响
+
+    def detect(self, frame):
+        """返回 (检测用灰度图, 检测图上的角点, 缩放比例)，未检测到时角点为 None"""
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        s = max(1.0, gray.shape[1] / float(DETECT_WIDTH))
+        if s > 1.0:
+            gray = cv2.resize(gray, (int(gray.shape[1] / s), int(gray.shape[0] / s)), interpolation=cv2.INTER_AREA)
+        flags = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK
+        ret, corners = cv2.findChessboardCorners(gray, self.pattern_size, flags)
+        return gray, (corners if ret else None), s
+
+    def _is_stable(self, corners):
+        # 角点数量固定，直接按下标比较相邻两帧的位移
+        prev, self._prev = self._prev, corners
+        if prev is None or prev.shape != corners.shape:
+            self._stable = 0
+            return False
+        moved = float(np.linalg.norm(corners - prev, axis=-1).mean())
+        self._stable = self._stable + 1 if moved < self.stable_px else 0
+        return self._stable >= self.stable_frames
+
+    def process(self, frame):
+        """处理一帧，保存时返回 True"""
+        gray, corners, _ = self.detect(frame)
+        if corners is None:
+            self._prev = None
+            self._stable = 0
+            return False
+        if not self._is_stable(corners):
+            return False
+        if time.monotonic() - self._last_capture < self.min_interval:
+            return False
+        pose = board_pose(corners, self.pattern_size, gray.shape[::-1])
+        if not self.coverage.is_needed(pose):
+            return False
+        if view_sharpness(gray, corners) < self.min_sharpness:
+            return False
+
+        self.coverage.add(pose)
+        self._last_capture = time.monotonic()
+        self._stable = 0
+        # 帧可能来自共享内存环形缓冲，交给界面线程前先复制
+        self.on_capture(frame.copy())
+        return True
+
+    def run(self):
+        last_seq = 0
+        while not self.stopped:
+            latest = self.vs.wait_for_frame(last_seq, timeout=0.5)
+            if latest is None:
+                if self.vs.stopped:
+                    break
+                continue
+            last_seq, _, frame = latest
+            try:
+                captured = self.process(frame)
+            except Exception as e:
+                print(f"自动采集错误: {e}")
+                captured = False
+            if captured and self.on_progress:
+                self.on_progress(self.coverage.summary(), self.coverage.is_complete())
+            if self.coverage.is_complete():
+                break
+            # 检测本身不需要满帧率，留出 CPU 给预览
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.stopped = True
@@ -0,0 +1,159 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2 as cv
+
+from calibration import CameraCalibrator, _init_detect_worker
+
+# 无界面批量标定: 只依赖 calibration 模块，不导入 tkinter 和 ONVIF 相关库
+
+
+def job_name(image_dir):
+    return re.sub(r'[^\w.-]+', '_', os.path.normpath(image_dir)).strip('_.') or 'camera'
+
+
+def load_jobs(args):
+    """由命令行目录和清单文件生成任务列表，清单中的字段覆盖命令行默认值"""
+    entries = [{'image_dir': d} for d in args.image_dirs]
+    if args.manifest:
+        with open(args.manifest, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        entries.extend(data.get('cameras', []) if isinstance(data, dict) else data)
+
+    jobs = []
+    for entry in entries:
+        name = entry.get('name') or job_name(entry['image_dir'])
+        jobs.append({
+            'name': name,
+            'image_dir': entry['image_dir'],
+            'corners': entry.get('corners', args.corners),
+            'square': float(entry.get('square', args.square)),
+            'output': entry.get('output') or os.path.join(args.out_dir, name + '.' + args.format),
+            'with_maps': args.maps,
+            'log': os.path.join(args.out_dir, name + '.log'),
+            'downscale': int(entry.get('downscale', args.downscale)),
+            'max_views': entry.get('max_views', args.max_views) or None,
+            'outlier_threshold': entry.get('reject', args.reject),
+            'use_cache': not args.no_cache,
+        })
+    return jobs
+
+
+def _first_image_size(image_dir):
+    for name in sorted(os.listdir(image_dir)):
+        if os.path.splitext(name)[1].lower() in ('.jpg', '.png'):
+            img = cv.imread(os.path.join(image_dir, name), cv.IMREAD_GRAYSCALE)
+            if img is not None:
+                return img.shape[1], img.shape[0]
+    return None
+
+
+def calibrate_camera(job):
+    """在子进程中标定一台相机，返回汇总信息 (可直接写入 JSON)"""
+    start = time.perf_counter()
+    result = {'name': job['name'], 'image_dir': job['image_dir'], 'params': None, 'rms': None}
+    log = io.StringIO()
+    try:
+        # 每台相机的输出写入单独的日志文件，避免多个进程的打印交错
+        with contextlib.redirect_stdout(log):
+            w, h = map(int, str(job['corners']).lower().split('x'))
+            image_size = _first_image_size(job['image_dir'])
+            if image_size is None:
+                raise ValueError("no readable images")
+            # 进程池已按相机并行，单台相机内部不再启动子进程
+            calibrator = CameraCalibrator(image_size, workers=1)
+            rms = calibrator.calibration(corner_height=h, corner_width=w, square_size=job['square'],
+                                         image_dir=job['image_dir'], use_cache=job['use_cache'],
+                                         downscale=job['downscale'], max_views=job['max_views'],
+                                         outlier_threshold=job['outlier_threshold'])
+            result.update(image_size=list(image_size), **calibrator.stats)
+            if rms is False:
+                raise ValueError("calibration failed")
+            calibrator.save_params(job['output'], with_maps=job['with_maps'])
+        result.update(status='ok', rms=float(rms), params=job['output'],
+                      fx=float(calibrator.matrix[0, 0]), fy=float(calibrator.matrix[1, 1]),
+                      cx=float(calibrator.matrix[0, 2]), cy=float(calibrator.matrix[1, 2]),
+                      dist=[float(d) for d in calibrator.dist.ravel()],
+                      worst_views=sorted(({'file': os.path.basename(v['file']), 'rms': v['rms'], 'used': v['used']}
+                                          for v in calibrator.view_errors), key=lambda v: -v['rms'])[:5])
+    except Exception as e:
+        result.update(status='failed', error=str(e))
+    result['total_s'] = time.perf_counter() - start
+    try:
+        with open(job['log'], 'w', encoding='utf-8') as f:
+            f.write(log.getvalue())
+    except OSError:
+        pass
+    return result
+
+
+def write_summary(path, results, elapsed):
+    summary = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'elapsed_s': elapsed,
+        'cameras': len(results),
+        'succeeded': sum(1 for r in results if r['status'] == 'ok'),
+        'results': results,
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量标定多台相机 (无界面)")
+    parser.add_argument("image_dirs", nargs='*', help="截图目录，每个目录对应一台相机")
+    parser.add_argument("--manifest", help="JSON 清单: [{name, image_dir, corners, square, output, ...}]")
+    parser.add_argument("--corners", default="9x9", help="角点数 (宽x高)")
+    parser.add_argument("--square", type=float, default=20)
+    parser.add_argument("--out-dir", default="batch_output")
+    parser.add_argument("--format", choices=["xml", "npz"], default="xml", help="参数文件格式")
+    parser.add_argument("--maps", action="store_true", help="npz 中同时保存定点映射表")
+    parser.add_argument("--summary", default=None, help="汇总 JSON 路径 (默认 <out-dir>/summary.json)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="同时标定的相机数")
+    parser.add_argument("--downscale", type=int, default=1)
+    parser.add_argument("--max-views", type=int, default=0, help="最多使用视图数 (0=全部)")
+    parser.add_argument("--reject", type=float, default=None, help="剔除重投影误差超过该值 (px) 的视图")
+    parser.add_argument("--no-cache", action="store_true", help="不使用角点缓存")
+    args = parser.parse_args(argv)
+
+    jobs = load_jobs(args)
+    if not jobs:
+        parser.error("no image directories given")
+    if not os.path.exists(args.out_dir):
+        os.makedirs(args.out_dir)
+    summary_path = args.summary or os.path.join(args.out_dir, 'summary.json')
+
+    start = time.perf_counter()
+    results = [None] * len(jobs)
+    workers = max(1, min(args.jobs, len(jobs)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_detect_worker) as executor:
+        futures = {executor.submit(calibrate_camera, job): i for i, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            results[i] = r = future.result()
+            if r['status'] == 'ok':
+                print("[{}/{}] {}: RMS {:.4f}, {}/{} views, {:.1f} s".format(
+                    done, len(jobs), r['name'], r['rms'], r['used'], r['images'], r['total_s']))
+            else:
+                print("[{}/{}] {}: {}".format(done, len(jobs), r['name'], r['error']))
+
+    elapsed = time.perf_counter() - start
+    write_summary(summary_path, results, elapsed)
+    failed = sum(1 for r in results if r['status'] != 'ok')
+    print("Done: {} cameras, {} failed, {:.1f} s. Summary: {}".format(len(jobs), failed, elapsed, summary_path))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,500 @@
+import argparse
+import asyncio
+import glob
+import ipaddress
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2 as cv
+import numpy as np
+
+from calibration import CameraCalibrator, detect_corners, select_views
+from preview import PreviewWorker
+import synthetic
+
+
+def _time_loop(func, repeat):
+    # 先预热一次，再统计平均耗时 (毫秒)
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000.0 / repeat
+
+
+def bench_rectify(param_file, width, height, repeat):
+    """对比逐帧 cv.undistort 与预计算映射表 remap 的耗时"""
+    calibrator = CameraCalibrator((width, height))
+    if not calibrator.load_params(param_file):
+        print("无法加载参数文件: {}".format(param_file))
+        return None
+
+    frame = np.random.randint(0, 256, (height, width, 3), np.uint8)
+
+    def old_path():
+        cv.undistort(frame, calibrator.matrix, calibrator.dist, None, calibrator.new_camera_matrix)
+
+    def cached_path():
+        calibrator.rectify_image(frame)
+
+    undistort_ms = _time_loop(old_path, repeat)
+    remap_ms = _time_loop(cached_path, repeat)
+
+    # 两条路径的结果应当基本一致 (定点插值会带来 1 个灰度级左右的差异)
+    ref = cv.undistort(frame, calibrator.matrix, calibrator.dist, None, calibrator.new_camera_matrix)
+    diff = np.abs(ref.astype(np.int16) - calibrator.rectify_image(frame).astype(np.int16))
+
+    print("分辨率 {}x{}, 重复 {} 次".format(width, height, repeat))
+    print("  cv.undistort (逐帧重建映射): {:.2f} ms/帧".format(undistort_ms))
+    print("  cv.remap (缓存映射表):       {:.2f} ms/帧".format(remap_ms))
+    print("  加速比: {:.1f}x, 平均像素差: {:.3f}".format(undistort_ms / remap_ms, diff.mean()))
+    return {"undistort_ms": undistort_ms, "remap_ms": remap_ms}
+
+
+def bench_load(param_file, width, height, repeat):
+    """对比 XML、npz (仅参数) 和 npz (含映射表，内存映射) 从加载到输出第一帧矫正图的耗时"""
+    source = CameraCalibrator((width, height))
+    if not source.load_params(param_file):
+        print("无法加载参数文件: {}".format(param_file))
+        return None
+    frame = np.random.randint(0, 256, (height, width, 3), np.uint8)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        files = {
+            "xml": os.path.join(tmp_dir, "params.xml"),
+            "npz": os.path.join(tmp_dir, "params.npz"),
+            "npz+maps": os.path.join(tmp_dir, "params_maps.npz"),
+        }
+        source.save_params(files["xml"])
+        source.save_params(files["npz"])
+        source.save_params(files["npz+maps"], with_maps=True)
+        reference = source.rectify_image(frame)
+
+        results = dict()
+        for name, path in files.items():
+            load_times, first_times = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                calibrator = CameraCalibrator((width, height))
+                calibrator.load_params(path)
+                loaded = time.perf_counter()
+                out = calibrator.rectify_image(frame)
+                load_times.append((loaded - start) * 1000.0)
+                first_times.append((time.perf_counter() - start) * 1000.0)
+            results[name] = {"load_ms": float(np.median(load_times)), "first_frame_ms": float(np.median(first_times)),
+                             "size_kb": os.path.getsize(path) / 1024.0, "same": bool(np.array_equal(out, reference))}
+    finally:
+        # 内存映射的映射表在 Linux 上删除文件后仍可访问，Windows 上可能删不掉，忽略错误
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("分辨率 {}x{}, 重复 {} 次 (中位数)".format(width, height, repeat))
+    for name, r in results.items():
+        print("  {:<9} 加载 {:7.2f} ms, 到第一帧矫正图 {:7.2f} ms, 文件 {:8.1f} KB, 结果一致: {}".format(
+            name, r["load_ms"], r["first_frame_ms"], r["size_kb"], r["same"]))
+    return results
+
+
+def _nearest_corner_dist(a, b):
+    a = a.reshape(-1, 1, 2)
+    b = b.reshape(1, -1, 2)
+    return np.linalg.norm(a - b, axis=-1).min(axis=1)
+
+
+def bench_detection(image_dir, corner_height, corner_width, square_size, downscale):
+    """对比全分辨率搜索与缩小图粗搜 + 原图精化两种角点检测方式的速度和精度"""
+    file_names = []
+    for ext in ['*.JPG', '*.jpg', '*.png']:
+        file_names.extend(glob.glob(os.path.join(image_dir, ext)))
+    if not file_names:
+        print("No images found in directory.")
+        return None
+
+    criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    pattern_size = (corner_height, corner_width)
+    win_size = (int(square_size // 2), int(square_size // 2))
+    image_size = cv.imread(file_names[0], cv.IMREAD_GRAYSCALE).shape[::-1]
+
+    results = dict()
+    for scale in (1, downscale):
+        start = time.perf_counter()
+        corners = [detect_corners(f, pattern_size, win_size, criteria, scale)[1] for f in file_names]
+        elapsed_ms = (time.perf_counter() - start) * 1000.0 / len(file_names)
+
+        found = [c for c in corners if c is not None]
+        rms = None
+        if found:
+            calibrator = CameraCalibrator(image_size)
+            obj_corner = calibrator.cal_real_corner(corner_height, corner_width, square_size)
+            rms = cv.calibrateCamera([obj_corner] * len(found), found, image_size, None, None)[0]
+        results[scale] = {"corners": corners, "ms": elapsed_ms, "found": len(found), "rms": rms}
+
+    base, coarse = results[1], results[downscale]
+    # 方形棋盘格的角点起始方向可能不同，按最近邻匹配比较偏差
+    diffs = [_nearest_corner_dist(a, b) for a, b in zip(base["corners"], coarse["corners"])
+             if a is not None and b is not None]
+    diffs = np.concatenate(diffs) if diffs else np.zeros(0)
+
+    print("{} 张图片, 分辨率 {}x{}".format(len(file_names), image_size[0], image_size[1]))
+    for scale in (1, downscale):
+        r = results[scale]
+        print("  downscale={}: {:.1f} ms/张, 检出 {}/{}, RMS {}".format(
+            scale, r["ms"], r["found"], len(file_names), "-" if r["rms"] is None else "{:.4f}".format(r["rms"])))
+    if diffs.size:
+        print("  角点偏差 (相对全分辨率): 平均 {:.4f} px, 最大 {:.4f} px".format(diffs.mean(), diffs.max()))
+    print("  加速比: {:.2f}x".format(base["ms"] / coarse["ms"]))
+    return {"full_ms": base["ms"], "coarse_ms": coarse["ms"],
+            "mean_corner_diff": float(diffs.mean()) if diffs.size else None}
+
+
+def _reprojection_rms(matrix, dist, obj_corner, imgs_corner):
+    # 固定内参，对每个视图单独求位姿后统计全部角点的重投影 RMS
+    sq_err, count = 0.0, 0
+    for img_corners in imgs_corner:
+        ok, rvec, tvec = cv.solvePnP(obj_corner, img_corners, matrix, dist)
+        if not ok:
+            continue
+        proj, _ = cv.projectPoints(obj_corner, rvec, tvec, matrix, dist)
+        sq_err += float(np.sum((proj.reshape(-1, 2) - img_corners.reshape(-1, 2)) ** 2))
+        count += len(obj_corner)
+    return np.sqrt(sq_err / count) if count else None
+
+
+def bench_selection(image_dir, corner_height, corner_width, square_size, max_views):
+    """对比全部视图与筛选后视图的标定耗时和精度 (筛选后的内参在全部视图上评估)"""
+    file_names = []
+    for ext in ['*.JPG', '*.jpg', '*.png']:
+        file_names.extend(glob.glob(os.path.join(image_dir, ext)))
+    criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    pattern_size = (corner_height, corner_width)
+    win_size = (int(square_size // 2), int(square_size // 2))
+
+    found_files, imgs_corner, sharpness = [], [], []
+    for f in file_names:
+        _, corners, sharp = detect_corners(f, pattern_size, win_size, criteria)
+        if corners is not None:
+            found_files.append(f)
+            imgs_corner.append(corners)
+            sharpness.append(sharp)
+    if len(imgs_corner) < 2:
+        print("Not enough views with corners.")
+        return None
+    image_size = cv.imread(found_files[0], cv.IMREAD_GRAYSCALE).shape[::-1]
+    obj_corner = CameraCalibrator(image_size).cal_real_corner(corner_height, corner_width, square_size)
+
+    start = time.perf_counter()
+    keep = select_views(sharpness, imgs_corner, pattern_size, image_size, max_views)
+    select_ms = (time.perf_counter() - start) * 1000.0
+
+    results = dict()
+    for name, views in (("full", imgs_corner), ("selected", [imgs_corner[i] for i in keep])):
+        start = time.perf_counter()
+        rms, matrix, dist, _, _ = cv.calibrateCamera([obj_corner] * len(views), views, image_size, None, None)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        results[name] = {"views": len(views), "ms": elapsed_ms, "rms": rms,
+                         "rms_all": _reprojection_rms(matrix, dist, obj_corner, imgs_corner),
+                         "fx": float(matrix[0, 0]), "fy": float(matrix[1, 1])}
+
+    full, sel = results["full"], results["selected"]
+    print("{} 张图片, 检出 {} 张".format(len(file_names), len(imgs_corner)))
+    for name in ("full", "selected"):
+        r = results[name]
+        print("  {:<8} 视图 {:3d}, 标定 {:8.1f} ms, RMS {:.4f}, 全部视图上的 RMS {:.4f}, fx {:.1f}, fy {:.1f}".format(
+            name, r["views"], r["ms"], r["rms"], r["rms_all"], r["fx"], r["fy"]))
+    saved_ms = full["ms"] - sel["ms"] - select_ms
+    print("  筛选耗时 {:.1f} ms, 共节省 {:.1f} ms ({:.0f}%), RMS 变化 {:+.4f}, 全部视图上的 RMS 变化 {:+.4f}".format(
+        select_ms, saved_ms, 100.0 * saved_ms / full["ms"], sel["rms"] - full["rms"], sel["rms_all"] - full["rms_all"]))
+    results["select_ms"] = select_ms
+    return results
+
+
+def _suite_meta():
+    return {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "platform": platform.platform(),
+        "python": sys.version.split()[0],
+        "opencv": cv.__version__,
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+        "opencv_threads": cv.getNumThreads(),
+    }
+
+
+def bench_resolution(name, views, repeat, workers, panel_size, pattern_size=(9, 6), square_size=25.0, seed=0):
+    """渲染一种分辨率的合成视图，测量各阶段耗时并与真值参数比较"""
+    size = synthetic.RESOLUTIONS[name]
+    true_matrix = synthetic.true_camera_matrix(size)
+    start = time.perf_counter()
+    renderer = synthetic.ChessboardRenderer(size, true_matrix, synthetic.TRUE_DIST, pattern_size, square_size)
+    poses = synthetic.random_poses(views, pattern_size, square_size, size, true_matrix, seed)
+
+    image_dir = tempfile.mkdtemp(prefix="synthetic_{}_".format(name))
+    try:
+        frame = None
+        for i, (rvec, tvec) in enumerate(poses):
+            img, _ = renderer.render(rvec, tvec, seed=seed + i)
+            # PNG 无损，避免 JPEG 压缩影响精度比较
+            cv.imwrite(os.path.join(image_dir, "chess_{:02d}.png".format(i)), img)
+            if frame is None:
+                frame = img
+        render_s = time.perf_counter() - start
+
+        calibrator = CameraCalibrator(size, workers=workers)
+        rms = calibrator.calibration(corner_height=pattern_size[0], corner_width=pattern_size[1],
+                                     square_size=square_size, image_dir=image_dir, use_cache=False)
+    finally:
+        shutil.rmtree(image_dir, ignore_errors=True)
+    if rms is False:
+        return {"size": list(size), "ok": False}
+    stats = calibrator.stats
+
+    # 精度: 焦距相对误差、主点偏差和整幅画面的去畸变偏差
+    m, t = calibrator.matrix, true_matrix
+    undistort_mean, undistort_max = synthetic.undistort_error(size, m, calibrator.dist, t, synthetic.TRUE_DIST)
+    accuracy = {
+        "rms": float(rms),
+        "fx_err_pct": float(abs(m[0, 0] - t[0, 0]) / t[0, 0] * 100),
+        "fy_err_pct": float(abs(m[1, 1] - t[1, 1]) / t[1, 1] * 100),
+        "cx_err_px": float(abs(m[0, 2] - t[0, 2])),
+        "cy_err_px": float(abs(m[1, 2] - t[1, 2])),
+        "undistort_mean_px": undistort_mean,
+        "undistort_max_px": undistort_max,
+    }
+    # 容差按分辨率换算: 焦距 0.5%，主点和平均去畸变偏差 0.1% 画面宽度
+    tol_px = 0.001 * size[0]
+    passed = (accuracy["fx_err_pct"] < 0.5 and accuracy["fy_err_pct"] < 0.5 and accuracy["cx_err_px"] < tol_px
+              and accuracy["cy_err_px"] < tol_px and undistort_mean < tol_px)
+
+    preview = PreviewWorker(None, calibrator, None)
+    preview.rectify = True
+    timings = {
+        "render_ms_per_view": render_s * 1000.0 / views,
+        "detect_ms_per_view": stats["detect_s"] * 1000.0 / views,
+        "calibrate_ms": stats["calibrate_s"] * 1000.0,
+        "rectify_ms": _time_loop(lambda: calibrator.rectify_image(frame), repeat),
+        "display_rectified_ms": _time_loop(lambda: preview.render(frame, panel_size), repeat),
+    }
+    preview.rectify = False
+    timings["display_ms"] = _time_loop(lambda: preview.render(frame, panel_size), repeat)
+    return {"size": list(size), "ok": bool(passed), "views": views, "detected": stats["detected"],
+            "accuracy": accuracy, "timings": timings}
+
+
+def bench_suite(resolutions, views, repeat, workers, panel_size, out_path=None, baseline=None):
+    """合成棋盘格基准: 各分辨率下的检测、标定、矫正和显示转换耗时，以及参数精度，结果输出为 JSON"""
+    results = {"meta": _suite_meta(), "config": {"views": views, "repeat": repeat, "panel": list(panel_size)},
+               "results": dict()}
+    for name in resolutions:
+        print("--- {} ---".format(name))
+        r = bench_resolution(name, views, repeat, workers, panel_size)
+        results["results"][name] = r
+        if "timings" not in r:
+            print("  标定失败")
+            continue
+        for key, value in r["timings"].items():
+            print("  {:<22} {:9.2f}".format(key, value))
+        for key, value in r["accuracy"].items():
+            print("  {:<22} {:9.4f}".format(key, value))
+        print("  {:<22} {}".format("accuracy_ok", r["ok"]))
+
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            base = json.load(f)["results"]
+        print("--- 与基线 {} 比较 (当前 / 基线) ---".format(baseline))
+        for name, r in results["results"].items():
+            old = base.get(name, {}).get("timings")
+            if not old or "timings" not in r:
+                continue
+            for key, value in r["timings"].items():
+                if old.get(key):
+                    print("  {:<6} {:<22} {:6.2f}x".format(name, key, value / old[key]))
+
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        print("结果已写入 {}".format(out_path))
+    return results
+
+
+async def _fake_devices():
+    """在 127.0.0.1 的随机端口上启动模拟的 ONVIF、RTSP 和普通网页服务，返回 (服务列表, 各自端口)"""
+    replies = {
+        "onvif": b"HTTP/1.1 200 OK\r\nContent-Type: application/soap+xml\r\n\r\n"
+                 b'<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"><s:Body/></s:Envelope>',
+        "rtsp": b"RTSP/1.0 200 OK\r\nCSeq: 1\r\nPublic: OPTIONS, DESCRIBE\r\n\r\n",
+        "http": b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n<html></html>",
+    }
+    servers, ports = [], dict()
+    for kind, reply in replies.items():
+        async def handle(reader, writer, reply=reply):
+            await reader.read(4096)
+            writer.write(reply)
+            await writer.drain()
+            writer.close()
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        servers.append(server)
+        ports[kind] = server.sockets[0].getsockname()[1]
+    return servers, ports
+
+
+def bench_sweep(cidr, concurrency, rate):
+    """网段扫描: 对本机模拟设备探测，只应发现 ONVIF 和 RTSP 服务，普通网页不算；返回是否符合预期"""
+    import scanner
+
+    async def run():
+        servers, ports = await _fake_devices()
+        try:
+            # 普通网页端口同时按 ONVIF 和 RTSP 探测，两种都不应命中
+            start = time.perf_counter()
+            found = await scanner.sweep_async(cidr, onvif_ports=(ports["onvif"], ports["http"]),
+                                              rtsp_ports=(ports["rtsp"], ports["http"]),
+                                              concurrency=concurrency, rate=rate)
+            return ports, found, time.perf_counter() - start
+        finally:
+            for server in servers:
+                server.close()
+                await server.wait_closed()
+
+    ports, found, elapsed = asyncio.run(run())
+    hosts = ipaddress.ip_network(cidr, strict=False).num_addresses
+    expected = [("127.0.0.1", ports["onvif"], "onvif"), ("127.0.0.1", ports["rtsp"], "rtsp")]
+    print("扫描 {} ({} 个地址 x 4 个端口): {:.2f} s".format(cidr, hosts, elapsed))
+    print("发现: {}".format(found))
+    ok = sorted(found) == sorted(expected)
+    print("结果{}".format("符合预期" if ok else "不符合预期，应为 {}".format(expected)))
+    return ok
+
+
+# 启动时不应加载的模块: 它们只在扫描设备或显示第一帧时才需要
+LAZY_MODULES = ("scanner", "onvif", "zeep", "wsdiscovery", "netifaces", "PIL")
+
+
+def _import_times(module):
+    """在新进程中用 -X importtime 导入 module，返回 [(嵌套深度, 模块名, 累计耗时 (微秒))]，按输出顺序"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                          cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    entries = []
+    for line in proc.stderr.splitlines():
+        parts = line[len("import time:"):].split("|") if line.startswith("import time:") else []
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # 表头或其他输出
+        name = parts[2].rstrip()
+        # 子模块先于父模块输出，每深一层多缩进两个空格
+        entries.append(((len(name) - len(name.lstrip()) - 1) // 2, name.strip(), int(parts[1])))
+    return entries
+
+
+def bench_imports(module, repeat, budget_ms=None, top=10):
+    """测量冷启动导入耗时 (取多次的中位数)，超出预算或提前加载了 LAZY_MODULES 时返回 False"""
+    totals = []
+    entries = None
+    for _ in range(repeat):
+        entries = _import_times(module)
+        totals.append(next(us for depth, name, us in entries if depth == 0 and name == module) / 1000.0)
+    total_ms = sorted(totals)[len(totals) // 2]
+    print("import {}: {:.1f} ms (中位数, {} 次)".format(module, total_ms, repeat))
+
+    # module 直接导入的依赖: 上一个顶层条目之后、module 之前的第一层条目
+    children = []
+    for depth, name, us in entries:
+        if depth == 0:
+            if name == module:
+                break
+            children = []
+        elif depth == 1:
+            children.append((us, name))
+    for us, name in sorted(children, reverse=True)[:top]:
+        print("  {:<24} {:8.1f} ms".format(name, us / 1000.0))
+
+    ok = True
+    eager = sorted({name.split(".")[0] for _, name, _ in entries} & set(LAZY_MODULES))
+    if eager:
+        print("启动时加载了应延迟导入的模块: {}".format(", ".join(eager)))
+        ok = False
+    if budget_ms is not None and total_ms > budget_ms:
+        print("导入耗时超出预算 {:.0f} ms".format(budget_ms))
+        ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IPC-Calib-GUI 性能基准")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_rectify = sub.add_parser("rectify", help="畸变矫正: undistort vs remap")
+    p_rectify.add_argument("--params", default="camera_params.xml")
+    p_rectify.add_argument("--size", default="1920x1080")
+    p_rectify.add_argument("--repeat", type=int, default=50)
+
+    p_load = sub.add_parser("load", help="参数加载: XML vs npz vs npz + 映射表")
+    p_load.add_argument("--params", default="camera_params.xml")
+    p_load.add_argument("--size", default="1920x1080")
+    p_load.add_argument("--repeat", type=int, default=20)
+
+    p_detect = sub.add_parser("detect", help="角点检测: 全分辨率 vs 缩小图粗搜")
+    p_detect.add_argument("image_dir")
+    p_detect.add_argument("--corners", default="9x9", help="角点数 (宽x高)")
+    p_detect.add_argument("--square", type=float, default=20)
+    p_detect.add_argument("--downscale", type=int, default=2)
+
+    p_select = sub.add_parser("select", help="视图筛选: 全部视图 vs 去重后的子集")
+    p_select.add_argument("image_dir")
+    p_select.add_argument("--corners", default="9x9", help="角点数 (宽x高)")
+    p_select.add_argument("--square", type=float, default=20)
+    p_select.add_argument("--max-views", type=int, default=20)
+
+    p_suite = sub.add_parser("suite", help="合成棋盘格基准: 检测/标定/矫正/显示耗时与精度")
+    p_suite.add_argument("--resolutions", default="720p,1080p,4k")
+    p_suite.add_argument("--views", type=int, default=15)
+    p_suite.add_argument("--repeat", type=int, default=20)
+    p_suite.add_argument("--workers", type=int, default=None, help="角点检测进程数 (默认全部核心)")
+    p_suite.add_argument("--panel", default="1280x720", help="预览面板尺寸")
+    p_suite.add_argument("--out", default="benchmark_results.json")
+    p_suite.add_argument("--baseline", default=None, help="之前的结果 JSON，用于比较")
+
+    p_sweep = sub.add_parser("sweep", help="网段扫描: 本机模拟 ONVIF/RTSP/网页服务的探测结果与耗时")
+    p_sweep.add_argument("--cidr", default="127.0.0.0/29", help="需在 127.0.0.0/8 内，模拟服务只监听 127.0.0.1")
+    p_sweep.add_argument("--concurrency", type=int, default=1000)
+    p_sweep.add_argument("--rate", type=float, default=2000)
+
+    p_imports = sub.add_parser("imports", help="冷启动导入耗时 (python -X importtime)")
+    p_imports.add_argument("--module", default="gui")
+    p_imports.add_argument("--repeat", type=int, default=5)
+    p_imports.add_argument("--budget", type=float, default=None, help="导入耗时上限 (毫秒)，超出时返回非零")
+
+    args = parser.parse_args()
+    if args.command == "rectify":
+        w, h = map(int, args.size.lower().split('x'))
+        bench_rectify(args.params, w, h, args.repeat)
+    elif args.command == "load":
+        w, h = map(int, args.size.lower().split('x'))
+        bench_load(args.params, w, h, args.repeat)
+    elif args.command == "detect":
+        w, h = map(int, args.corners.lower().split('x'))
+        bench_detection(args.image_dir, h, w, args.square, args.downscale)
+    elif args.command == "suite":
+        panel = tuple(map(int, args.panel.lower().split('x')))
+        ok = bench_suite(args.resolutions.lower().split(','), args.views, args.repeat, args.workers, panel,
+                         args.out, args.baseline)
+        if not all(r["ok"] for r in ok["results"].values()):
+            sys.exit(1)
+    elif args.command == "select":
+        w, h = map(int, args.corners.lower().split('x'))
+        bench_selection(args.image_dir, h, w, args.square, args.max_views)
+    elif args.command == "sweep":
+        if not bench_sweep(args.cidr, args.concurrency, args.rate):
+            sys.exit(1)
+    elif args.command == "imports":
+        if not bench_imports(args.module, args.repeat, args.budget):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
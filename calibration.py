@@ -2,22 +2,227 @@ import os
 import cv2 as cv
 import numpy as np
 import glob
+import multiprocessing
+import struct
+import threading
+import time
+import zipfile
 import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from corner_cache import CornerCache
+import metrics
+
+PARAMS_VERSION = 1  # 二进制参数文件 (.npz) 的格式版本
+MAX_DISPLAY_MAPS = 4  # 标定分辨率以外 (如显示尺寸) 的映射表最多缓存几组，拖动窗口时尺寸不断变化
+
+
+def _init_detect_worker():
+    # 每个子进程只用单线程，避免与进程池的并行互相抢占 CPU
+    cv.setNumThreads(1)
+
+
+def detect_corners(file_name, pattern_size, win_size, criteria, downscale=1):
+    """检测单张图片的棋盘格角点，返回 (图片可读, 角点或 None, 棋盘区域清晰度)
+
+    downscale > 1 时先在缩小的图像上粗搜棋盘格，再把角点放大回原图做亚像素精化；
+    粗搜失败时退回全分辨率搜索，检出率不低于原流程。
+    """
+    gray = cv.imread(file_name, cv.IMREAD_GRAYSCALE)
+    if gray is None:
+        return False, None, 0.0
+
+    ret = False
+    if downscale > 1:
+        small = cv.resize(gray, None, fx=1.0 / downscale, fy=1.0 / downscale, interpolation=cv.INTER_AREA)
+        ret, img_corners = cv.findChessboardCorners(small, pattern_size)
+        if ret:
+            small_win = (max(2, win_size[0] // downscale), max(2, win_size[1] // downscale))
+            img_corners = cv.cornerSubPix(small, img_corners, small_win, (-1, -1), criteria)
+            # 像素中心对齐后放大到原图坐标
+            img_corners = ((img_corners + 0.5) * downscale - 0.5).astype(np.float32)
+    if not ret:
+        ret, img_corners = cv.findChessboardCorners(gray, pattern_size)
+    if not ret:
+        return True, None, 0.0
+    img_corners = cv.cornerSubPix(gray, img_corners, win_size, (-1, -1), criteria)
+    # 图像已在内存中，顺便计算清晰度供视图筛选使用，避免之后重新读图
+    return True, img_corners, view_sharpness(gray, img_corners)
+
+
+def view_sharpness(gray, corners):
+    """棋盘格区域 (角点外接矩形) 的拉普拉斯方差，越大越清晰"""
+    x, y, w, h = cv.boundingRect(corners.reshape(-1, 2).astype(np.float32))
+    roi = gray[max(0, y):y + h, max(0, x):x + w]
+    return float(cv.Laplacian(roi, cv.CV_64F).var()) if roi.size else 0.0
+
+
+def canonical_corners(corners, pattern_size):
+    """把角点旋转到统一的起始方向: 左上角 (x + y 最小) 的外角点排在最前面
+
+    棋盘格检测的起始角点不固定 (非方形可能反转 180°，方形可能旋转 90°)，
+    统一方向后不同视图的角点可以按下标直接比较。
+    """
+    grid = corners.reshape(pattern_size[1], pattern_size[0], 2)
+    candidates = [grid, grid[::-1, ::-1]]
+    if pattern_size[0] == pattern_size[1]:
+        candidates += [np.rot90(grid, 1), np.rot90(grid, 3)]
+    best = min(candidates, key=lambda g: float(g[0, 0].sum()))
+    return best.reshape(-1, 2)
+
+
+def view_distances(imgs_corner, pattern_size, image_size):
+    """两两视图之间的位姿距离: 对应角点的平均位移，按画面对角线归一化"""
+    pts = np.array([canonical_corners(c, pattern_size) for c in imgs_corner], np.float32)
+    n = len(pts)
+    diag = float(np.hypot(image_size[0], image_size[1]))
+    dist = np.zeros((n, n), np.float32)
+    for i in range(n - 1):
+        d = np.linalg.norm(pts[i + 1:] - pts[i], axis=-1).mean(axis=1) / diag
+        dist[i, i + 1:] = dist[i + 1:, i] = d
+    return dist
+
+
+def select_views(sharpness, imgs_corner, pattern_size, image_size, max_views=None, dup_threshold=0.01):
+    """按清晰度和角点分布打分，去掉近似重复的位姿，再用最远点采样保留最多 max_views 个视图
+
+    返回保留视图的下标 (保持原顺序)。dup_threshold 为判定重复的位姿距离 (画面对角线的比例)。
+    """
+    n = len(imgs_corner)
+    if n <= 1:
+        return list(range(n))
+    sharp = np.array(sharpness, np.float64)
+    spread = np.array([cv.contourArea(cv.convexHull(c)) for c in imgs_corner]) / float(image_size[0] * image_size[1])
+    # 清晰度的绝对值随相机和场景变化，按中位数归一化；棋盘格铺得越开约束越强
+    quality = np.clip(sharp / max(float(np.median(sharp)), 1e-6), 0.0, 1.5) * (0.5 + np.sqrt(spread))
+    dist = view_distances(imgs_corner, pattern_size, image_size)
+
+    # 质量从高到低遍历，与已保留视图过于接近的视为重复
+    kept = []
+    for i in np.argsort(-quality):
+        if not kept or dist[i, kept].min() > dup_threshold:
+            kept.append(int(i))
+    unique = len(kept)
+
+    if max_views and len(kept) > max_views:
+        # 最远点采样: 每次加入离已选视图最远 (按质量加权) 的视图，保证位姿多样
+        selected, rest = kept[:1], kept[1:]
+        while len(selected) < max_views:
+            score = dist[np.ix_(rest, selected)].min(axis=1) * quality[rest]
+            selected.append(rest.pop(int(np.argmax(score))))
+        kept = selected
+
+    print("View selection: kept {} of {} views ({} near-duplicates removed).".format(len(kept), n, n - unique))
+    return sorted(kept)
+
+
+def rodrigues_batch(rvecs):
+    """批量把旋转向量 (N, 3) 转换为旋转矩阵 (N, 3, 3)"""
+    r = np.asarray(rvecs, np.float64).reshape(-1, 3)
+    theta = np.linalg.norm(r, axis=1)
+    k = r / np.maximum(theta, 1e-12)[:, None]
+    kx = np.zeros((len(r), 3, 3))
+    kx[:, 0, 1], kx[:, 0, 2], kx[:, 1, 2] = -k[:, 2], k[:, 1], -k[:, 0]
+    kx -= kx.transpose(0, 2, 1)
+    c, s = np.cos(theta)[:, None, None], np.sin(theta)[:, None, None]
+    return np.eye(3) * c + (1 - c) * k[:, :, None] * k[:, None, :] + s * kx
+
+
+def project_points_batch(obj_pts, rvecs, tvecs, matrix, dist):
+    """一次性投影所有视图的角点 (N, K, 3) -> (N, K, 2)，畸变模型与 cv.projectPoints 的 5 参数模型一致"""
+    obj_pts = np.asarray(obj_pts, np.float64)
+    d = np.zeros(5)
+    coeffs = np.asarray(dist, np.float64).ravel()
+    if coeffs.size > 5 and np.any(coeffs[5:]):
+        # 有理/薄棱镜等高阶模型交给 OpenCV 逐视图计算
+        return np.array([cv.projectPoints(o, r, t, matrix, dist)[0].reshape(-1, 2)
+                         for o, r, t in zip(obj_pts, rvecs, tvecs)])
+    d[:min(5, coeffs.size)] = coeffs[:5]
+    k1, k2, p1, p2, k3 = d
+
+    cam = np.einsum('nij,nkj->nki', rodrigues_batch(rvecs), obj_pts)
+    cam += np.asarray(tvecs, np.float64).reshape(-1, 1, 3)
+    x, y = cam[..., 0] / cam[..., 2], cam[..., 1] / cam[..., 2]
+    r2 = x * x + y * y
+    radial = 1 + r2 * (k1 + r2 * (k2 + r2 * k3))
+    xd = x * radial + 2 * p1 * x * y + p2 * (r2 + 2 * x * x)
+    yd = y * radial + p1 * (r2 + 2 * y * y) + 2 * p2 * x * y
+    m = np.asarray(matrix, np.float64)
+    return np.stack([m[0, 0] * xd + m[0, 1] * yd + m[0, 2], m[1, 1] * yd + m[1, 2]], axis=-1)
+
+
+def reprojection_errors(objs_corner, imgs_corner, rvecs, tvecs, matrix, dist):
+    """返回 (每个视图的 RMS (N,), 每个角点的误差 (N, K))，单位为像素"""
+    proj = project_points_batch(objs_corner, rvecs, tvecs, matrix, dist)
+    observed = np.array([c.reshape(-1, 2) for c in imgs_corner], np.float64)
+    corner_errors = np.linalg.norm(proj - observed, axis=-1)
+    return np.sqrt((corner_errors ** 2).mean(axis=1)), corner_errors
+
+
+def scale_camera_matrix(matrix, from_size, to_size):
+    """把相机矩阵从 from_size 分辨率换算到 to_size (同一视场，按像素中心对齐)"""
+    sx, sy = to_size[0] / from_size[0], to_size[1] / from_size[1]
+    scaled = np.array(matrix, np.float64)
+    scaled[0, 0] *= sx
+    scaled[0, 1] *= sx
+    scaled[1, 1] *= sy
+    scaled[0, 2] = (scaled[0, 2] + 0.5) * sx - 0.5
+    scaled[1, 2] = (scaled[1, 2] + 0.5) * sy - 0.5
+    return scaled
+
+
+def load_npz_arrays(path, mmap_names=()):
+    """读取 npz 中的全部数组；mmap_names 中未压缩存储的数组以只读内存映射返回，不拷贝到内存"""
+    arrays = dict()
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as f:
+        for info in zf.infolist():
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if name not in mmap_names or info.compress_type != zipfile.ZIP_STORED:
+                with zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+            # 本地文件头 (30 字节 + 文件名 + 扩展字段) 之后就是 .npy 的原始内容
+            f.seek(info.header_offset)
+            name_len, extra_len = struct.unpack('<HH', f.read(30)[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                     order='F' if fortran else 'C')
+    return arrays
 
 
 class CameraCalibrator(object):
-    def __init__(self, image_size: tuple):
+    def __init__(self, image_size: tuple, workers: int = None):
         super(CameraCalibrator, self).__init__()
         self.image_size = image_size
+        # 角点检测的进程数，None 表示使用全部 CPU 核心，1 表示在当前进程中串行执行
+        self.workers = workers
         self.matrix = np.zeros((3, 3), np.float32)
         self.new_camera_matrix = np.zeros((3, 3), np.float32)
         self.dist = np.zeros((1, 5), np.float32)
         self.roi = np.zeros(4, np.int32)
         self.is_calibrated = False  # 添加标记
+        # 最近一次标定中每张图的重投影误差: [{'file', 'rms', 'used'}]，used 为 False 表示被剔除
+        self.view_errors = []
+        self.corner_errors = None  # 参与标定的视图的逐角点误差 (视图数, 角点数)
+        # 最近一次标定的图片数量和各阶段耗时 (秒)
+        self.stats = dict()
+        # 预计算的矫正映射表 (定点格式)，按 (输入尺寸, 输出尺寸) 缓存，参数变化时整体失效；
+        # 标定分辨率的全尺寸映射表一直保留，其他尺寸 (预览按显示尺寸矫正) 只保留最近用过的 MAX_DISPLAY_MAPS 组
+        self._maps = OrderedDict()
+        self._maps_params = None
+        self._maps_lock = threading.Lock()  # 预览线程与主线程可能同时请求映射表
 
     def load_params(self, param_file: str = 'camera_params.xml'):
         if not os.path.exists(param_file):
             return False  # 返回状态而不是直接退出
+        if param_file.lower().endswith('.npz'):
+            return self._load_npz(param_file)
 
         try:
             tree = ET.parse(param_file)
@@ -56,12 +261,71 @@ class CameraCalibrator(object):
                     self.roi[i] = int(roi['data{}'.format(i)])
 
             self.is_calibrated = True
+            self.update_rectify_maps(self.image_size)
+            return True
+        except Exception as e:
+            print(f"Loading params failed: {e}")
+            return False
+
+    def _load_npz(self, param_file):
+        try:
+            data = load_npz_arrays(param_file, ('map1', 'map2'))
+            if int(data['version']) > PARAMS_VERSION:
+                print("Unsupported params version {} in {}.".format(int(data['version']), param_file))
+                return False
+            size = tuple(int(v) for v in data['image_size'])
+            image_size = (int(self.image_size[0]), int(self.image_size[1]))
+            matrix = np.array(data['camera_matrix'], np.float64)
+            new_camera_matrix = np.array(data['new_camera_matrix'], np.float64)
+            roi = np.array(data['roi'], np.int32)
+            has_maps = 'map1' in data and 'map2' in data
+            if size != image_size:
+                # 参数按标定分辨率保存，换算到当前分辨率，映射表作废
+                matrix = scale_camera_matrix(matrix, size, image_size)
+                new_camera_matrix = scale_camera_matrix(new_camera_matrix, size, image_size)
+                sx, sy = image_size[0] / size[0], image_size[1] / size[1]
+                roi = np.round(roi * np.array([sx, sy, sx, sy])).astype(np.int32)
+                has_maps = False
+
+            self.matrix = matrix
+            self.new_camera_matrix = new_camera_matrix
+            self.dist = np.array(data['camera_distortion'], np.float64).reshape(1, -1)
+            self.roi = roi
+            self.is_calibrated = True
+            with self._maps_lock:
+                self._maps = OrderedDict()
+                self._maps_params = self._params_key()
+                if has_maps:
+                    # 映射表直接映射文件内容，首次 remap 时才按需读入
+                    self._maps[(image_size, image_size)] = (data['map1'], data['map2'])
+            self.update_rectify_maps(self.image_size)
             return True
         except Exception as e:
             print(f"Loading params failed: {e}")
             return False
 
-    def save_params(self, save_path='camera_params.xml'):
+    def _save_npz(self, save_path, with_maps):
+        arrays = {
+            'version': np.array(PARAMS_VERSION, np.int32),
+            'image_size': np.array(self.image_size, np.int32),
+            'camera_matrix': np.asarray(self.matrix, np.float64),
+            'new_camera_matrix': np.asarray(self.new_camera_matrix, np.float64),
+            'camera_distortion': np.asarray(self.dist, np.float64),
+            'roi': np.asarray(self.roi, np.int32),
+        }
+        if with_maps:
+            arrays['map1'], arrays['map2'] = self.update_rectify_maps(self.image_size)
+        # np.savez 不压缩，读取时映射表可以直接内存映射
+        tmp_path = save_path + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, save_path)
+        print("Saved params in {}.".format(save_path))
+
+    def save_params(self, save_path='camera_params.xml', with_maps=False):
+        # .npz 为二进制格式，with_maps 时一并保存全分辨率定点映射表，加载后无需重新计算
+        if save_path.lower().endswith('.npz'):
+            self._save_npz(save_path, with_maps)
+            return
         root = ET.Element('root')
         tree = ET.ElementTree(root)
         comment = ET.Element('about')
@@ -95,8 +359,28 @@ class CameraCalibrator(object):
         obj_corner[:, :2] = np.mgrid[0:corner_height, 0:corner_width].T.reshape(-1, 2)
         return obj_corner * square_size
 
-    def calibration(self, corner_height: int, corner_width: int, square_size: float, image_dir: str):
+    def detect_all(self, file_names, pattern_size, win_size, criteria, downscale=1):
+        workers = self.workers if self.workers is not None else (os.cpu_count() or 1)
+        workers = max(1, min(workers, len(file_names)))
+        if not file_names:
+            return []
+        if workers == 1:
+            return [detect_corners(f, pattern_size, win_size, criteria, downscale) for f in file_names]
+
+        # 与 SharedMemoryVideoStream 一致使用 spawn: 标定在 GUI 的后台线程中启动，
+        # 此时预览、采集、写入线程都在运行，fork 可能复制到被其他线程持有的锁
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_detect_worker, mp_context=ctx) as executor:
+            return list(executor.map(detect_corners, file_names, repeat(pattern_size), repeat(win_size),
+                                     repeat(criteria), repeat(downscale)))
+
+    def calibration(self, corner_height: int, corner_width: int, square_size: float, image_dir: str,
+                    use_cache: bool = True, downscale: int = 1, max_views: int = None,
+                    outlier_threshold: float = None, max_rounds: int = 3):
         # 修改：接受 image_dir 参数
+        # downscale: 粗搜棋盘格时的缩小倍数 (1 为原流程，2/4 适合 1080p/4K)
+        # max_views: 不为空时先去掉近似重复的视图，最多保留这么多个参与标定
+        # outlier_threshold: 不为空时剔除重投影 RMS 超过该值 (像素) 的视图并重新标定，最多 max_rounds 轮
         extensions = ['*.JPG', '*.jpg', '*.png']
         file_names = []
         for ext in extensions:
@@ -108,41 +392,161 @@ class CameraCalibrator(object):
 
         objs_corner = []
         imgs_corner = []
+        self.stats = {'images': len(file_names)}
+        start = time.perf_counter()
         criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 30, 0.001)
         obj_corner = self.cal_real_corner(corner_height, corner_width, square_size)
+        pattern_size = (corner_height, corner_width)
+        win_size = (int(square_size // 2), int(square_size // 2))
+
+        # 已缓存的图片直接复用角点，只对新增或修改过的图片做检测
+        results = [None] * len(file_names)
+        cache = None
+        if use_cache:
+            cache = CornerCache(image_dir, {'pattern': list(pattern_size), 'win_size': list(win_size),
+                                           'downscale': downscale})
+            for i, file_name in enumerate(file_names):
+                hit, img_corners, sharpness = cache.lookup(file_name)
+                if hit:
+                    results[i] = (True, img_corners, sharpness)
+        pending = [i for i, result in enumerate(results) if result is None]
+        if cache is not None:
+            print("Corner cache: {} cached, {} to detect.".format(len(file_names) - len(pending), len(pending)))
+
+        # 结果与 file_names 顺序一一对应，与子进程完成的先后无关
+        detected = self.detect_all([file_names[i] for i in pending], pattern_size, win_size, criteria, downscale)
+        for i, result in zip(pending, detected):
+            results[i] = result
+            if cache is not None and result[0]:
+                cache.store(file_names[i], result[1], result[2])
+        if cache is not None:
+            cache.prune(file_names)
+            try:
+                cache.save()
+            except Exception as e:
+                print(f"Saving corner cache failed: {e}")
 
         found_count = 0
-        for file_name in file_names:
-            chess_img = cv.imread(file_name)
-            if chess_img is None: continue
-            gray = cv.cvtColor(chess_img, cv.COLOR_BGR2GRAY)
-            ret, img_corners = cv.findChessboardCorners(gray, (corner_height, corner_width))
-            if ret:
+        found_files = []
+        found_sharpness = []
+        for file_name, (readable, img_corners, sharpness) in zip(file_names, results):
+            if not readable:
+                continue
+            if img_corners is not None:
                 objs_corner.append(obj_corner)
-                img_corners = cv.cornerSubPix(gray, img_corners, (square_size // 2, square_size // 2), (-1, -1),
-                                              criteria)
                 imgs_corner.append(img_corners)
+                found_files.append(file_name)
+                found_sharpness.append(sharpness)
                 found_count += 1
             else:
                 print("Fail to find corners in {}.".format(file_name))
 
+        self.stats.update(detected=found_count, cached=len(file_names) - len(pending),
+                          detect_s=time.perf_counter() - start)
         if found_count < 1:
             return False
 
-        ret, self.matrix, self.dist, rvecs, tveces = cv.calibrateCamera(objs_corner, imgs_corner, self.image_size, None,
-                                                                        None)
+        start = time.perf_counter()
+        # used 为参与标定的视图在全部检测结果中的下标；筛选掉和剔除的视图最后同样记录误差
+        used = list(range(found_count))
+        if max_views:
+            used = select_views(found_sharpness, imgs_corner, pattern_size, self.image_size, max_views)
+        self.stats.update(selected=len(used), select_s=time.perf_counter() - start)
+
+        ret, self.matrix, self.dist, rvecs, tveces = cv.calibrateCamera(
+            [objs_corner[i] for i in used], [imgs_corner[i] for i in used], self.image_size, None, None)
+        view_rms, corner_errors = reprojection_errors([objs_corner[i] for i in used], [imgs_corner[i] for i in used],
+                                                      rvecs, tveces, self.matrix, self.dist)
+        for round_index in range(max_rounds if outlier_threshold else 0):
+            # 每轮最多剔除 10% 最差的视图，单个坏视图会拉高其他视图的误差，不能一次全部剔除
+            worst = [j for j in np.argsort(-view_rms) if view_rms[j] > outlier_threshold]
+            worst = worst[:max(1, len(used) // 10)]
+            if not worst or len(used) - len(worst) < 3:
+                break
+            for j in worst:
+                print("Round {}: drop {} (RMS {:.3f} px).".format(round_index + 1, found_files[used[j]], view_rms[j]))
+            used = [i for j, i in enumerate(used) if j not in worst]
+            # 以上一轮的结果作为初值，迭代收敛更快
+            ret, self.matrix, self.dist, rvecs, tveces = cv.calibrateCamera(
+                [objs_corner[i] for i in used], [imgs_corner[i] for i in used], self.image_size,
+                self.matrix.copy(), self.dist.copy(), flags=cv.CALIB_USE_INTRINSIC_GUESS)
+            view_rms, corner_errors = reprojection_errors([objs_corner[i] for i in used],
+                                                          [imgs_corner[i] for i in used],
+                                                          rvecs, tveces, self.matrix, self.dist)
+        self._record_view_errors(found_files, objs_corner, imgs_corner, used, view_rms, corner_errors)
+        self.stats.update(used=len(used), calibrate_s=time.perf_counter() - start)
+        metrics.histogram('calibration_detect_seconds', '标定: 角点检测耗时 (秒)',
+                          metrics.SECONDS_BUCKETS).observe(self.stats['detect_s'])
+        metrics.histogram('calibration_solve_seconds', '标定: 视图筛选、求解和剔除耗时 (秒)',
+                          metrics.SECONDS_BUCKETS).observe(self.stats['calibrate_s'])
+
         self.new_camera_matrix, roi = cv.getOptimalNewCameraMatrix(self.matrix, self.dist, self.image_size, alpha=0)
         self.roi = np.array(roi)
         self.is_calibrated = True
+        self.update_rectify_maps(self.image_size)
         return ret
 
-    def rectify_image(self, img):
+    def _record_view_errors(self, files, objs_corner, imgs_corner, used, view_rms, corner_errors):
+        # 筛选掉或被剔除的视图按最终内参单独求位姿，误差与参与标定的视图可以直接比较
+        rms = dict(zip(used, view_rms))
+        self.view_errors = []
+        for i, file_name in enumerate(files):
+            if i not in rms:
+                ok, rvec, tvec = cv.solvePnP(objs_corner[i], imgs_corner[i], self.matrix, self.dist)
+                rms[i] = reprojection_errors([objs_corner[i]], [imgs_corner[i]], [rvec], [tvec],
+                                             self.matrix, self.dist)[0][0] if ok else float('inf')
+            self.view_errors.append({'file': file_name, 'rms': float(rms[i]), 'used': i in used})
+        self.corner_errors = corner_errors
+
+    def _params_key(self):
+        return (tuple(self.image_size), self.matrix.tobytes(), self.dist.tobytes(),
+                self.new_camera_matrix.tobytes())
+
+    def update_rectify_maps(self, size, out_size=None):
+        """返回输入尺寸 size 的矫正映射表 (map1, map2)，尺寸和参数未变化时直接复用缓存
+
+        out_size 不为空时直接生成缩放到该输出尺寸的映射表，例如预览只需按显示分辨率做一次 remap。
+        size 与标定分辨率不同 (例如用主码流标定、子码流预览) 时按比例换算相机参数。
+        """
+        size = (int(size[0]), int(size[1]))
+        out_size = size if out_size is None else (int(out_size[0]), int(out_size[1]))
+        params = self._params_key()
+        with self._maps_lock:
+            if params != self._maps_params:
+                self._maps = OrderedDict()
+                self._maps_params = params
+            key = (size, out_size)
+            maps = self._maps.get(key)
+            if maps is not None:
+                self._maps.move_to_end(key)
+                return maps
+
+            # 参数对应 self.image_size；输入是其他分辨率 (如子码流) 或需要缩放输出时按比例换算
+            image_size = (int(self.image_size[0]), int(self.image_size[1]))
+            matrix = self.matrix
+            if size != image_size:
+                matrix = scale_camera_matrix(self.matrix, image_size, size)
+            new_camera_matrix = self.new_camera_matrix
+            if out_size != image_size:
+                new_camera_matrix = scale_camera_matrix(self.new_camera_matrix, image_size, out_size)
+            # CV_16SC2 + 插值表的定点格式比浮点表小一半，remap 也更快
+            maps = cv.initUndistortRectifyMap(matrix, self.dist, None, new_camera_matrix, out_size, cv.CV_16SC2)
+            self._maps[key] = maps
+            full = (image_size, image_size)
+            display = [k for k in self._maps if k != full]
+            for k in display[:-MAX_DISPLAY_MAPS]:
+                del self._maps[k]
+            return maps
+
+    def rectify_image(self, img, out_size=None):
         if not self.is_calibrated:
             return img
-        dst = cv.undistort(img, self.matrix, self.dist, None, self.new_camera_matrix)
+        # 每帧只做一次 remap，映射表仅在尺寸或参数变化时重建
+        map1, map2 = self.update_rectify_maps((img.shape[1], img.shape[0]), out_size)
+        dst = cv.remap(img, map1, map2, cv.INTER_LINEAR)
         # 可选：裁剪黑边
         # x, y, w, h = self.roi
         # if w > 0 and h > 0:
         #     dst = dst[y:y + h, x:x + w]
         # dst = cv.resize(dst, (self.image_size[0], self.image_size[1]))
-        return dst
\ No newline at end of file
+        return dst
@@ -1,46 +1,536 @@
 import cv2
 import threading
+import multiprocessing
 import time
 import os
+import random
+import numpy as np
+from multiprocessing import shared_memory
+import metrics
+
+# 采集帧数和读取耗时只统计 record_metrics 为真的视频流 (当前预览的那一路)，多路或取帧器的后台连接不计入
+CAPTURE_FRAMES = metrics.counter('capture_frames_total', '当前预览的视频流采集到的帧数')
+CAPTURE_FAILURES = metrics.counter('capture_read_failures_total', 'cap.read() 失败次数')
+CAPTURE_READ_MS = metrics.histogram('capture_read_ms', 'cap.read() 耗时，含等待下一帧和解码 (毫秒)')
+CAPTURE_STALLS = metrics.counter('capture_stalls_total', '视频流超时无画面、触发重连的次数')
+CAPTURE_RECONNECTS = metrics.counter('capture_reconnects_total', '视频流重连成功次数')
+
+
+def parse_source(url):
+    # 兼容数字ID (本地摄像头) 和 字符串URL (RTSP)
+    if str(url).isdigit():
+        return int(url)
+    return url
+
+
+def open_capture(src, open_timeout=None, read_timeout=None):
+    """打开视频源；超时 (秒) 为空时使用后端默认值 (FFMPEG 断流时 read() 可能阻塞数十秒)"""
+    # 优化 FFMPEG 参数
+    os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = "rtsp_transport;udp|fflags;nobuffer"
+    params = []
+    # 旧版 OpenCV 没有这两个属性，此时只能依赖后端默认超时
+    if open_timeout and hasattr(cv2, 'CAP_PROP_OPEN_TIMEOUT_MSEC'):
+        params += [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(open_timeout * 1000)]
+    if read_timeout and hasattr(cv2, 'CAP_PROP_READ_TIMEOUT_MSEC'):
+        params += [cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(read_timeout * 1000)]
+    if params:
+        return cv2.VideoCapture(src, cv2.CAP_FFMPEG, params)
+    return cv2.VideoCapture(src, cv2.CAP_FFMPEG)
 
 
 class VideoStream:
-    def __init__(self, url):
-        # 优化 FFMPEG 参数
-        os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = "rtsp_transport;udp|fflags;nobuffer"
-        # 兼容数字ID (本地摄像头) 和 字符串URL (RTSP)
-        if str(url).isdigit():
-            self.src = int(url)
-        else:
-            self.src = url
+    """后台线程拉流，只保留最新一帧
 
-        self.cap = cv2.VideoCapture(self.src, cv2.CAP_FFMPEG)
+    连接成功后如果超过 stall_timeout 秒没有收到画面 (读取失败或阻塞)，会断开并按指数退避
+    (带随机抖动) 自动重连；max_reconnects 为连续重连 (期间没收到画面) 的次数上限，为空时无限重试。
+    state 为当前连接状态: connecting / streaming / stalled / reconnecting / stopped。
+    record_metrics 为假时不计入采集帧数、读取失败和读取耗时指标，可随时切换。
+    """
+
+    def __init__(self, url, max_fps=None, stall_timeout=5.0, open_timeout=10.0, max_reconnects=None,
+                 backoff_base=0.5, backoff_max=30.0, record_metrics=True):
+        self.src = parse_source(url)
+        self.record_metrics = record_metrics
+        # 限制输出帧率: 超出的帧只 grab 不 retrieve，省去颜色转换和下游处理
+        self.max_fps = max_fps
+        self.stall_timeout = stall_timeout
+        self.open_timeout = open_timeout
+        self.max_reconnects = max_reconnects
+        self.backoff_base = backoff_base  # 第 n 次重连前等待 min(backoff_max, backoff_base * 2^n) 秒
+        self.backoff_max = backoff_max
+
+        # 读取超时与中断判定一致，阻塞的 read() 最迟在 stall_timeout 后返回
+        self.cap = open_capture(self.src, open_timeout, stall_timeout)
         self.ret, self.frame = False, None
+        # 帧序号从 1 开始单调递增，0 表示尚未收到画面；timestamp 为采集时刻 (time.monotonic)
+        self.seq = 0
+        self.timestamp = 0.0
         self.stopped = False
+        self.thread = None
         self.lock = threading.Lock()  # 添加锁保证线程安全
+        self.new_frame = threading.Condition(self.lock)  # 有新帧时唤醒等待者
+
+        # 采集帧数；丢帧和重复帧与消费者的读取进度有关，由各消费者 (如 PreviewWorker) 自行统计
+        self.frames_captured = 0
+
+        # 连接状态: reconnects 为重连成功次数，reconnect_attempts 含失败的尝试
+        self._state = 'connecting'
+        self.reconnects = 0
+        self.reconnect_attempts = 0
+        self.last_error = None
+        self._backoff_attempt = 0  # 收到画面后清零，连上但一直无画面时退避时间继续增长
+        self._last_data = time.monotonic()  # 最近一次 grab/read 成功 (或连上) 的时刻
 
     def start(self):
         t = threading.Thread(target=self.update, args=())
         t.daemon = True
+        self.thread = t
         t.start()
         return self
 
     def update(self):
+        try:
+            self._capture_loop()
+        finally:
+            # 由采集线程自己释放，避免 stop() 在 read() 进行中释放句柄导致崩溃
+            self.cap.release()
+
+    def _capture_loop(self):
+        min_interval = 1.0 / self.max_fps if self.max_fps else 0.0
         while not self.stopped:
             if not self.cap.isOpened():
-                self.stop()
-            else:
-                ret, frame = self.cap.read()
-                with self.lock:
-                    self.ret = ret
+                # 首次连接失败由调用方通过 is_opened() 处理，不自动重试
+                if not self.seq or not self._reconnect("视频源已关闭"):
+                    self.stop()
+                    break
+                continue
+            if time.monotonic() - self._last_data > self.stall_timeout:
+                CAPTURE_STALLS.inc()
+                if not self._reconnect(f"{self.stall_timeout:g} 秒无画面"):
+                    self.stop()
+                    break
+                continue
+            if min_interval and time.monotonic() - self.timestamp < min_interval:
+                # 仍需把数据从缓冲中取走，否则画面会越积越旧
+                if self.cap.grab():
+                    self._last_data = time.monotonic()
+                else:
+                    time.sleep(0.005)
+                continue
+            # read() 本身会阻塞到下一帧到达，无需额外 sleep 轮询
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if self.record_metrics:
+                if ret:
+                    CAPTURE_READ_MS.observe((time.perf_counter() - start) * 1000.0)
+                    CAPTURE_FRAMES.inc()
+                else:
+                    CAPTURE_FAILURES.inc()
+            with self.new_frame:
+                self.ret = ret
+                if ret:
                     self.frame = frame
-            time.sleep(0.005)
+                    self.seq += 1
+                    self.timestamp = self._last_data = time.monotonic()
+                    self.frames_captured += 1
+                    self._state = 'streaming'
+                    self._backoff_attempt = 0
+                    self.new_frame.notify_all()
+                elif self._state == 'streaming':
+                    self._state = 'stalled'
+            if not ret:
+                # 读取失败时稍作等待，避免空转占满 CPU
+                time.sleep(0.005)
+
+    def _reconnect(self, reason):
+        """断开当前连接并按指数退避重连，连上时返回 True；已停止或超出重连次数时返回 False
+
+        只在采集线程中调用，cap 始终由采集线程打开和释放。
+        """
+        print(f"视频流中断 ({reason})，准备重连: {self.src}")
+        self.last_error = reason
+        self._state = 'reconnecting'
+        self.cap.release()
+        while not self.stopped:
+            if self.max_reconnects is not None and self._backoff_attempt >= self.max_reconnects:
+                print(f"连续重连 {self._backoff_attempt} 次仍无画面，放弃: {self.src}")
+                return False
+            delay = min(self.backoff_max, self.backoff_base * 2 ** self._backoff_attempt)
+            # 随机抖动: 交换机重启等导致多路同时断线时，错开各路的重连时刻
+            delay = random.uniform(delay / 2, delay)
+            with self.new_frame:
+                # stop() 会唤醒等待，不必等满退避时间
+                if self.new_frame.wait_for(lambda: self.stopped, delay):
+                    return False
+            self._backoff_attempt += 1
+            self.reconnect_attempts += 1
+            self.cap = open_capture(self.src, self.open_timeout, self.stall_timeout)
+            if self.cap.isOpened():
+                print(f"重连成功 (第 {self._backoff_attempt} 次尝试): {self.src}")
+                self.reconnects += 1
+                CAPTURE_RECONNECTS.inc()
+                self._state = 'connecting'
+                self._last_data = time.monotonic()
+                return True
+            self.cap.release()
+        return False
+
+    @property
+    def state(self):
+        if self.stopped:
+            return 'stopped'
+        # 没有读取超时支持时 read() 可能一直阻塞，按帧龄补充判断
+        if self._state == 'streaming' and time.monotonic() - self._last_data > self.stall_timeout:
+            return 'stalled'
+        return self._state
+
+    def status(self):
+        """连接状态摘要，供界面显示或记录日志"""
+        return {'state': self.state, 'reconnects': self.reconnects, 'reconnect_attempts': self.reconnect_attempts,
+                'last_error': self.last_error, 'frame_age': self.frame_age()}
 
     def read(self):
         with self.lock:
             return self.ret, self.frame
 
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def _take_latest(self):
+        # 调用方需持有锁
+        return self.seq, self.timestamp, self.frame
+
+    def read_frame(self):
+        """立即返回最新帧 (序号, 采集时间, 图像)，序号为 0 表示尚无画面"""
+        with self.lock:
+            return self._take_latest()
+
+    def wait_for_frame(self, last_seq, timeout=None):
+        """阻塞直到出现序号大于 last_seq 的帧，返回 (序号, 采集时间, 图像)；超时或已停止时返回 None"""
+        with self.new_frame:
+            if not self.new_frame.wait_for(lambda: self.seq > last_seq or self.stopped, timeout):
+                return None
+            if self.seq <= last_seq:
+                return None
+            return self._take_latest()
+
+    def frame_age(self):
+        """最新帧距今的秒数，尚无画面时返回 None"""
+        with self.lock:
+            if not self.seq:
+                return None
+            return time.monotonic() - self.timestamp
+
+    def stop(self):
+        self.stopped = True
+        with self.new_frame:
+            self.new_frame.notify_all()
+        if self.thread is None and self.cap.isOpened():
+            self.cap.release()
+
+
+class FrameGrabber:
+    """从另一路码流 (通常是主码流) 取单帧，用于子码流预览、主码流截图
+
+    keep_warm=True 时保持该码流常开 (低帧率)，取帧几乎无延迟；
+    否则每次取帧时临时连接，取到画面后立即断开。连拍等连续取帧期间可用 warm_up() / cool_down()
+    临时保持一路连接，避免同时建立多路会话。
+    """
+
+    def __init__(self, url, keep_warm=False, timeout=10.0):
+        self.src = parse_source(url)
+        self.keep_warm = keep_warm
+        self.timeout = timeout
+        self.vs = None
+        self.stopped = False
+        self._warm_users = 0  # warm_up() 尚未配对 cool_down() 的次数
+        self._warm_lock = threading.Lock()
+
+    def start(self):
+        if self.keep_warm:
+            self.vs = VideoStream(self.src, max_fps=5, record_metrics=False).start()
+        return self
+
+    def warm_up(self, max_fps=5):
+        """临时保持码流常开，直到配对的 cool_down()；阻塞到连接建立，请在后台线程中调用
+
+        返回连接是否可用，失败时 grab() 仍按每次临时连接取帧。
+        """
+        with self._warm_lock:
+            self._warm_users += 1
+            if self.vs is not None or self.stopped:
+                return self.vs is not None
+
+        vs = VideoStream(self.src, max_fps=max_fps, record_metrics=False)
+        with self._warm_lock:
+            # 连接期间可能已 cool_down() 或 stop()
+            if vs.is_opened() and self._warm_users and not self.stopped and self.vs is None:
+                self.vs = vs.start()
+                return True
+        vs.stop()
+        return False
+
+    def cool_down(self):
+        """结束一次 warm_up()，最后一次结束时断开临时连接 (keep_warm 的连接保持不变)"""
+        with self._warm_lock:
+            self._warm_users = max(0, self._warm_users - 1)
+            if self._warm_users or self.keep_warm:
+                return
+            vs, self.vs = self.vs, None
+        if vs is not None:
+            vs.stop()
+
+    def grab(self):
+        """阻塞取一帧，失败返回 None；请在后台线程中调用"""
+        vs = self.vs
+        if vs is not None:
+            # 取点击之后到达的帧，而不是缓冲里的旧帧
+            latest = vs.wait_for_frame(vs.seq, timeout=self.timeout)
+            return None if latest is None else latest[2]
+
+        # 连接和读取都设超时，主码流不可达时不会阻塞到远超 timeout (截图线程会被标定等待)
+        deadline = time.monotonic() + self.timeout
+        cap = open_capture(self.src, open_timeout=self.timeout, read_timeout=self.timeout)
+        try:
+            while cap.isOpened() and time.monotonic() < deadline:
+                ret, frame = cap.read()
+                if ret:
+                    return frame
+            return None
+        finally:
+            cap.release()
+
+    def stop(self):
+        with self._warm_lock:
+            self.stopped = True
+            self._warm_users = 0
+            vs, self.vs = self.vs, None
+        if vs is not None:
+            vs.stop()
+
+
+class VideoStreamPool:
+    """同时管理多路视频流，按名字 (通常是设备标签) 索引"""
+
+    def __init__(self, max_streams=16, max_fps=12, stream_cls=VideoStream):
+        self.max_streams = max_streams
+        self.max_fps = max_fps  # 每一路的输出帧率上限
+        self.stream_cls = stream_cls
+        self.streams = dict()
+        self.lock = threading.Lock()
+
+    def open(self, name, url):
+        """打开并启动一路视频流，超出路数上限或无法打开时返回 None"""
+        with self.lock:
+            if name in self.streams:
+                return self.streams[name]
+            if len(self.streams) >= self.max_streams:
+                print(f"已达到最大路数 {self.max_streams}，跳过: {name}")
+                return None
+
+        if self.stream_cls is VideoStream:
+            # 由使用方为当前预览的一路打开 record_metrics
+            vs = VideoStream(url, max_fps=self.max_fps, record_metrics=False).start()
+        else:
+            vs = self.stream_cls(url).start()
+        if not vs.is_opened():
+            vs.stop()
+            return None
+
+        with self.lock:
+            self.streams[name] = vs
+        return vs
+
+    def get(self, name):
+        with self.lock:
+            return self.streams.get(name)
+
+    def items(self):
+        with self.lock:
+            return list(self.streams.items())
+
+    def names(self):
+        with self.lock:
+            return list(self.streams)
+
+    def close(self, name):
+        with self.lock:
+            vs = self.streams.pop(name, None)
+        if vs is not None:
+            vs.stop()
+
+    def close_all(self):
+        with self.lock:
+            streams, self.streams = list(self.streams.values()), dict()
+        for vs in streams:
+            vs.stop()
+
+
+# --- 独立解码进程 + 共享内存环形缓冲 ---
+# 共享内存布局: [头部: 最新序号, 各槽位序号, 各槽位时间戳][槽位0图像][槽位1图像]...
+# 槽位序号为 -1 表示正在写入，读取方据此判断视图是否有效。
+
+def _ring_header_size(slots):
+    # 8 字节对齐的 int64 序号 + float64 时间戳，按 64 字节取整
+    return ((8 * (1 + 2 * slots) + 63) // 64) * 64
+
+
+def _ring_views(buf, slots, shape):
+    header = np.ndarray((1 + slots,), np.int64, buf, 0)
+    stamps = np.ndarray((slots,), np.float64, buf, 8 * (1 + slots))
+    frames = np.ndarray((slots,) + tuple(shape), np.uint8, buf, _ring_header_size(slots))
+    return header, stamps, frames
+
+
+def _capture_process(src, slots, conn, new_frame, stop_event):
+    """子进程: 拉流解码并写入共享内存环形缓冲"""
+    cap = open_capture(src)
+    ret, frame = cap.read() if cap.isOpened() else (False, None)
+    if not ret:
+        conn.send(None)
+        cap.release()
+        return
+
+    # 告知父进程画面尺寸，由父进程创建共享内存并回传名字
+    conn.send(frame.shape)
+    name = conn.recv()
+    shm = shared_memory.SharedMemory(name=name)
+    header, stamps, frames = _ring_views(shm.buf, slots, frame.shape)
+    shape = frame.shape
+
+    seq = 0
+    try:
+        while not stop_event.is_set():
+            if ret:
+                if frame.shape != shape:
+                    frame = cv2.resize(frame, (shape[1], shape[0]))
+                seq += 1
+                slot = (seq - 1) % slots
+                header[1 + slot] = -1
+                frames[slot] = frame
+                stamps[slot] = time.monotonic()
+                header[1 + slot] = seq
+                with new_frame:
+                    header[0] = seq
+                    new_frame.notify_all()
+            elif not cap.isOpened():
+                break
+            else:
+                time.sleep(0.005)
+            ret, frame = cap.read()
+    finally:
+        cap.release()
+        del header, stamps, frames
+        shm.close()
+
+
+class SharedMemoryVideoStream:
+    """在子进程中拉流解码，帧通过共享内存环形缓冲传回，接口与 VideoStream 相同
+
+    read()/read_frame()/wait_for_frame() 返回的是共享内存上的 NumPy 视图 (零拷贝)，
+    大约 slots 帧之后该槽位会被覆盖，需要长期保存的帧请自行 copy()。
+    """
+
+    def __init__(self, url, slots=8, open_timeout=10.0):
+        self.src = parse_source(url)
+        self.slots = slots
+        self.open_timeout = open_timeout
+        self.stopped = False
+        self.seq = 0
+        self.frames_captured = 0
+
+        # 使用 spawn 启动子进程，避免 fork 带有 Tk 和多线程的 GUI 进程
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, child_conn = ctx.Pipe()
+        self._new_frame = ctx.Condition()
+        self._stop_event = ctx.Event()
+        self._process = ctx.Process(target=_capture_process,
+                                    args=(self.src, slots, child_conn, self._new_frame, self._stop_event))
+        self._process.daemon = True
+        self._shm = None
+        self._header = self._stamps = self._frames = None
+
+    def start(self):
+        """启动解码子进程并等待首帧，打开失败时 is_opened() 返回 False"""
+        self._process.start()
+        try:
+            if not self._conn.poll(self.open_timeout):
+                return self
+            shape = self._conn.recv()
+        except (EOFError, OSError):
+            return self
+        if shape is None:
+            return self
+        nbytes = _ring_header_size(self.slots) + self.slots * int(np.prod(shape))
+        self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self._header, self._stamps, self._frames = _ring_views(self._shm.buf, self.slots, shape)
+        self._header[:] = 0
+        self._conn.send(self._shm.name)
+        return self
+
+    def is_opened(self):
+        return self._shm is not None and not self.stopped and self._process.is_alive()
+
+    def _latest(self):
+        # 返回最新的完整帧 (序号, 时间戳, 视图)；槽位正被覆盖时退回上一帧
+        header, stamps, frames = self._header, self._stamps, self._frames
+        if header is None:
+            return 0, 0.0, None
+        seq = int(header[0])
+        while seq > 0 and seq > int(header[0]) - self.slots:
+            slot = (seq - 1) % self.slots
+            if int(header[1 + slot]) == seq:
+                return seq, float(stamps[slot]), frames[slot]
+            seq -= 1
+        return 0, 0.0, None
+
+    def _take_latest(self):
+        seq, timestamp, frame = self._latest()
+        self.seq = self.frames_captured = seq
+        return seq, timestamp, frame
+
+    def read(self):
+        seq, _, frame = self._latest()
+        return seq > 0, frame
+
+    def read_frame(self):
+        """立即返回最新帧 (序号, 采集时间, 图像视图)，序号为 0 表示尚无画面"""
+        return self._take_latest()
+
+    def wait_for_frame(self, last_seq, timeout=None):
+        """阻塞直到出现序号大于 last_seq 的帧；超时或已停止时返回 None"""
+        header = self._header
+        if header is None:
+            return None
+        with self._new_frame:
+            ready = self._new_frame.wait_for(
+                lambda: int(header[0]) > last_seq or self.stopped or not self._process.is_alive(), timeout)
+        if not ready or self.stopped or int(header[0]) <= last_seq:
+            return None
+        return self._take_latest()
+
+    def frame_age(self):
+        seq, timestamp, _ = self._latest()
+        if not seq:
+            return None
+        return time.monotonic() - timestamp
+
     def stop(self):
+        if self.stopped:
+            return
         self.stopped = True
-        if self.cap.isOpened():
-            self.cap.release()
\ No newline at end of file
+        self._stop_event.set()
+        with self._new_frame:
+            self._new_frame.notify_all()
+        self._process.join(timeout=2)
+        if self._process.is_alive():
+            self._process.terminate()
+        if self._shm is not None:
+            self._header = self._stamps = self._frames = None
+            # 先 unlink，消费者仍持有视图时 close 可能失败，映射会在视图释放后回收
+            try:
+                self._shm.unlink()
+                self._shm.close()
+            except Exception:
+                pass
+            self._shm = None
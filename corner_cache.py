@@ -0,0 +1,102 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+CACHE_NAME = '.corners_cache.json'
+CACHE_VERSION = 2
+
+
+def file_digest(file_name):
+    h = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class CornerCache(object):
+    """截图目录旁的角点缓存文件，按文件路径、大小、修改时间和内容哈希记录检测结果"""
+
+    def __init__(self, image_dir, board=None):
+        super(CornerCache, self).__init__()
+        self.path = os.path.join(image_dir, CACHE_NAME)
+        # 棋盘格几何参数 (角点数、亚像素窗口等)，变化后旧结果全部作废
+        self.board = board
+        self.entries = dict()
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Corner cache ignored: {e}")
+            self.dirty = True
+            return
+        if data.get('version') != CACHE_VERSION:
+            self.dirty = True
+            return
+        if self.board is not None and data.get('board') != self.board:
+            self.dirty = True
+            return
+        if self.board is None:
+            self.board = data.get('board')
+        self.entries = data.get('entries', dict())
+
+    def save(self):
+        if not self.dirty:
+            return
+        data = {'version': CACHE_VERSION, 'board': self.board, 'entries': self.entries}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def lookup(self, file_name):
+        """命中时返回 (True, 角点或 None, 清晰度)，None 表示该图已判定为无棋盘格；未命中返回 (False, None, 0)"""
+        entry = self.entries.get(os.path.basename(file_name))
+        if entry is None:
+            return False, None, 0.0
+        try:
+            st = os.stat(file_name)
+        except OSError:
+            return False, None, 0.0
+        if st.st_size != entry['size']:
+            return False, None, 0.0
+        if st.st_mtime_ns != entry['mtime']:
+            # 修改时间变了但内容可能没变 (例如被复制过)，再用哈希确认
+            if file_digest(file_name) != entry['sha1']:
+                return False, None, 0.0
+            entry['mtime'] = st.st_mtime_ns
+            self.dirty = True
+
+        corners = entry['corners']
+        if corners is None:
+            return True, None, 0.0
+        return True, np.array(corners, np.float32).reshape(-1, 1, 2), entry['sharpness']
+
+    def store(self, file_name, corners, sharpness=0.0):
+        st = os.stat(file_name)
+        self.entries[os.path.basename(file_name)] = {
+            'size': st.st_size,
+            'mtime': st.st_mtime_ns,
+            'sha1': file_digest(file_name),
+            'corners': None if corners is None else corners.reshape(-1, 2).tolist(),
+            'sharpness': float(sharpness),
+        }
+        self.dirty = True
+
+    def evict(self, file_names):
+        for file_name in file_names:
+            if self.entries.pop(os.path.basename(file_name), None) is not None:
+                self.dirty = True
+
+    def prune(self, file_names):
+        """移除目录中已不存在的图片对应的条目"""
+        keep = set(os.path.basename(f) for f in file_names)
+        self.evict([name for name in self.entries if name not in keep])
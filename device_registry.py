@@ -0,0 +1,94 @@
+import os
+import re
+import json
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+DEVICE_CACHE_FILE = 'devices_cache.json'
+REGISTRY_DIR = './calib_registry'
+
+
+def strip_credentials(url):
+    """去掉 URL 中的账号密码，缓存文件中不保存明文密码"""
+    parts = urlsplit(url)
+    if parts.hostname is None or '@' not in parts.netloc:
+        return url
+    netloc = parts.netloc.rsplit('@', 1)[1]
+    return urlunsplit((parts.scheme, netloc, parts.path, parts.query, parts.fragment))
+
+
+def inject_credentials(url, user, password):
+    # 自动注入账号密码 (用于连接，不用于显示)
+    if user and password and "@" not in url:
+        parts = url.split("://")
+        if len(parts) == 2:
+            return f"{parts[0]}://{user}:{password}@{parts[1]}"
+    return url
+
+
+class DeviceCache(object):
+    """磁盘上的扫描结果缓存: 启动时立即填充设备列表，过期后在后台重新扫描 (stale-while-revalidate)"""
+
+    def __init__(self, path=DEVICE_CACHE_FILE, ttl=12 * 3600):
+        super(DeviceCache, self).__init__()
+        self.path = path
+        self.ttl = ttl
+
+    def load(self):
+        """返回 (设备列表, 是否仍在有效期内)，没有缓存时返回 ([], False)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return [], False
+        devices = data.get('devices', [])
+        for d in devices:
+            if d.get('resolution'):
+                d['resolution'] = tuple(d['resolution'])
+        fresh = time.time() - data.get('time', 0) < self.ttl
+        return devices, fresh
+
+    def save(self, devices):
+        # 本地 USB 相机的索引会变化，错误提示也不需要缓存
+        keep = [dict(d, value=strip_credentials(d['value'])) for d in devices if d.get('host')]
+        if not keep:
+            # 一次扫描失败 (例如网络暂时断开) 不覆盖已有缓存
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'time': time.time(), 'devices': keep}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"设备缓存保存失败: {e}")
+
+
+class CalibrationRegistry(object):
+    """按设备序列号和分辨率保存标定参数，连接已知相机时可直接加载"""
+
+    def __init__(self, root=REGISTRY_DIR):
+        super(CalibrationRegistry, self).__init__()
+        self.root = root
+
+    def path_for(self, serial, image_size, ext='.npz'):
+        safe = re.sub(r'[^\w.-]+', '_', str(serial)).strip('_')
+        return os.path.join(self.root, f"{safe}_{int(image_size[0])}x{int(image_size[1])}{ext}")
+
+    def find(self, serial, image_size):
+        if not serial:
+            return None
+        # 优先使用带映射表的二进制参数，兼容旧版本登记的 XML
+        for ext in ('.npz', '.xml'):
+            path = self.path_for(serial, image_size, ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def store(self, calibrator, serial):
+        if not serial:
+            return None
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+        path = self.path_for(serial, calibrator.image_size)
+        calibrator.save_params(path, with_maps=True)
+        return path
@@ -22,18 +22,29 @@ if sys.stdout is None:
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, scrolledtext
-import cv2
-from PIL import Image, ImageTk
 import os
-import glob
+import re
 import threading
+import multiprocessing
 import sys
 import time
+import logging
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from urllib.parse import urlparse
 # 导入功能模块
-from camera import VideoStream
+from camera import VideoStream, VideoStreamPool, SharedMemoryVideoStream, FrameGrabber
+from preview import PreviewWorker, MosaicWorker
 from calibration import CameraCalibrator
-# 导入新扫描模块
-from scanner import DeviceScanner
+from corner_cache import CornerCache
+from autocapture import AutoCaptureWorker
+from snapshot import SnapshotWriter, list_snapshots, next_snapshot_index, snapshot_name
+from device_registry import DeviceCache, CalibrationRegistry, inject_credentials
+import metrics
+
+DISPLAY_FRAMES = metrics.counter('display_frames_total', '界面实际显示的帧数')
+PIL_CONVERT_MS = metrics.histogram('pil_convert_ms', 'numpy 图像转换为 PIL 图像的耗时 (毫秒)')
+TK_DRAW_MS = metrics.histogram('tk_draw_ms', '写入 PhotoImage 并刷新控件的耗时 (毫秒)')
 
 user = "admin"
 psword = "admin"
@@ -41,23 +52,102 @@ psword = "admin"
 
 
 # --- 1. 日志重定向类 (用于将 print 输出到 GUI) ---
-class TextRedirector(object):
-    def __init__(self, widget, tag="stdout"):
+class LogSink(object):
+    """批量、限长的日志输出: 任意线程写入缓冲区，主线程按固定频率一次性插入文本框
+
+    文本框只保留最近 max_lines 行；log_file 不为空时同时写入滚动日志文件 (无法打开时只写文本框)。
+    """
+
+    def __init__(self, widget, max_lines=2000, interval=100, log_file=None, max_bytes=2 * 1024 * 1024,
+                 backup_count=3):
         self.widget = widget
+        self.max_lines = max_lines
+        self.interval = interval  # 刷新间隔 (毫秒)
+        # 两次刷新之间最多缓存的片段数，刷屏时丢弃最旧的部分
+        self.buffer = deque(maxlen=max_lines * 4)
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+        self.file_logger = None
+        self._partial = ""
+        if log_file:
+            try:
+                handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                              encoding="utf-8")
+            except OSError as e:
+                # 工作目录只读或文件被占用时不影响启动，只在文本框中显示日志
+                self.write(f"日志文件不可用 ({e})，日志仅在窗口中显示\n", "stderr")
+                return
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.file_logger = logging.getLogger("ipc_calib_gui")
+            self.file_logger.propagate = False
+            self.file_logger.setLevel(logging.INFO)
+            self.file_logger.addHandler(handler)
+
+    def write(self, text, tag="stdout"):
+        if not text:
+            return
+        with self.lock:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append((tag, text))
+
+    def start(self):
+        self.widget.after(self.interval, self._flush)
+        return self
+
+    def _flush(self):
+        with self.lock:
+            items = list(self.buffer)
+            self.buffer.clear()
+            dropped, self.dropped = self.dropped, 0
+
+        if items:
+            # 相邻同类标签的片段合并，一次 insert 写入全部内容
+            chunks = []
+            if dropped:
+                chunks.append(["stderr", f"... 日志过多，已省略 {dropped} 条 ...\n"])
+            for tag, text in items:
+                if chunks and chunks[-1][0] == tag:
+                    chunks[-1][1] += text
+                else:
+                    chunks.append([tag, text])
+            args = []
+            for tag, text in chunks:
+                args.extend((text, (tag,)))
+            try:
+                self.widget.configure(state='normal')
+                self.widget.insert(tk.END, *args)
+                line_count = int(self.widget.index('end-1c').split('.')[0])
+                if line_count > self.max_lines:
+                    self.widget.delete('1.0', f'{line_count - self.max_lines + 1}.0')
+                self.widget.see(tk.END)  # 自动滚动到底部
+                self.widget.configure(state='disabled')
+            except:
+                pass
+            self._write_file("".join(text for _, text in chunks))
+
+        self.widget.after(self.interval, self._flush)
+
+    def _write_file(self, text):
+        if self.file_logger is None:
+            return
+        # 只写完整的行，每行加时间戳
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        if lines:
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+            self.file_logger.info("\n".join(f"{stamp} {line}" for line in lines))
+
+
+class TextRedirector(object):
+    def __init__(self, sink, tag="stdout"):
+        self.sink = sink
         self.tag = tag
 
     def write(self, str):
-        # 使用 after 方法确保在主线程更新 UI，防止多线程崩溃
-        self.widget.after(0, self._append, str)
-
-    def _append(self, str):
-        try:
-            self.widget.configure(state='normal')
-            self.widget.insert(tk.END, str, (self.tag,))
-            self.widget.see(tk.END)  # 自动滚动到底部
-            self.widget.configure(state='disabled')
-        except:
-            pass
+        # 只写入缓冲区，由 LogSink 在主线程统一刷新，防止多线程崩溃
+        self.sink.write(str, self.tag)
 
     def flush(self):
         pass
@@ -73,15 +163,37 @@ class CameraGUI:
 
         # --- 状态变量 ---
         self.vs = None
+        self.preview = None  # 后台预览处理线程
+        self.grabber = None  # 子码流预览时，用于从主码流截图
+        self.photo = None  # 复用的预览图像缓冲
+        self.photo_size = None
         self.calibrator = None
         self.is_rectifying = False
-        self.save_dir = "./chess"
+        self.base_save_dir = "./chess"
+        self.save_dir = self.base_save_dir
         self.device_list = []
+        # 多路模式: 每路相机各自的标定器，截图保存到 ./chess/<相机名> 子目录
+        self.pool = None
+        self.calibrators = dict()
+        # 扫描结果缓存，以及按设备序列号保存的标定参数
+        self.device_cache = DeviceCache()
+        self.registry = CalibrationRegistry()
+        self.current_device = None
 
         if not os.path.exists(self.save_dir):
             os.makedirs(self.save_dir)
 
+        # 各截图目录已分配出去的下一个序号: 写入队列中的截图尚未落盘时，按磁盘文件计算会重复分配
+        self._next_index = dict()
+        self._pending_grabs = []  # 正在从主码流取帧、尚未交给写入线程的线程
         self.snapshot_count = self._get_next_index()
+        # 截图在后台线程编码写盘；连拍剩余张数
+        self.writer = SnapshotWriter(on_saved=self._on_snapshot_saved)
+        self.writer.start()
+        self.burst_remaining = 0
+        self._burst_warm = None  # 子码流连拍时 (主码流取帧器, 预热线程)
+        self.autocapture = None  # 自动采集线程
+        self.calibrating = False  # 标定期间不允许切换相机或推流，结果要写回发起标定的那台相机
 
         # --- 布局 ---
         # 左侧控制面板
@@ -93,21 +205,19 @@ class CameraGUI:
         self.video_panel.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=10, pady=10)
 
         self._init_controls()
+        self._load_device_cache()
 
     def _get_next_index(self):
-        files = glob.glob(os.path.join(self.save_dir, "chess_*.jpg"))
-        max_idx = -1
-        for f in files:
-            try:
-                name = os.path.basename(f)
-                part = name.replace("chess_", "").replace(".jpg", "")
-                if part.isdigit():
-                    idx = int(part)
-                    if idx > max_idx:
-                        max_idx = idx
-            except:
-                continue
-        return max_idx + 1
+        return max(next_snapshot_index(self.save_dir), self._next_index.get(self.save_dir, 0))
+
+    def _wait_for_snapshots(self):
+        """等待主码流取帧和后台写入全部完成，可在后台线程中调用"""
+        for t in list(self._pending_grabs):
+            t.join()
+        self.writer.flush()
+
+    def _count_text(self):
+        return f"下一张: {snapshot_name(self.snapshot_count, self.writer.fmt)}"
 
     def _init_controls(self):
         # 1. 连接设置
@@ -127,6 +237,13 @@ class CameraGUI:
         self.entry_pass.insert(0, psword)
         self.entry_pass.pack(side=tk.LEFT, padx=5)
 
+        # 跨网段/组播被过滤时，可指定网段主动扫描 ONVIF(80/8000) 与 RTSP(554) 端口
+        f_sweep = tk.Frame(p1)
+        f_sweep.pack(fill=tk.X, padx=5, pady=2)
+        ttk.Label(f_sweep, text="扫描网段 (可选):").pack(side=tk.LEFT)
+        self.entry_cidr = ttk.Entry(f_sweep)
+        self.entry_cidr.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+
         self.btn_scan = ttk.Button(p1, text="扫描局域网/USB设备", command=self.start_scan)
         self.btn_scan.pack(fill=tk.X, padx=5, pady=5)
 
@@ -141,16 +258,66 @@ class CameraGUI:
         self.entry_res.insert(0, "1920x1080")
         self.entry_res.pack(fill=tk.X, padx=5, pady=5)
 
+        # 预览解码低分辨率子码流，截图时从主码流取全分辨率图像
+        self.var_substream = tk.BooleanVar()
+        ttk.Checkbutton(p1, text="子码流预览 / 主码流截图", variable=self.var_substream).pack(anchor=tk.W, padx=5)
+        self.var_keep_main = tk.BooleanVar()
+        ttk.Checkbutton(p1, text="主码流保持连接 (截图更快)", variable=self.var_keep_main).pack(anchor=tk.W, padx=5)
+
+        self.var_process_decode = tk.BooleanVar()
+        ttk.Checkbutton(p1, text="独立进程解码 (共享内存)", variable=self.var_process_decode).pack(anchor=tk.W, padx=5)
+
         self.btn_connect = ttk.Button(p1, text="开始推流", command=self.toggle_stream)
         self.btn_connect.pack(fill=tk.X, padx=5, pady=5)
 
+        self.btn_pool = ttk.Button(p1, text="多路连接 (全部扫描设备)", command=self.toggle_pool)
+        self.btn_pool.pack(fill=tk.X, padx=5, pady=2)
+
+        ttk.Label(p1, text="当前相机 (多路模式, 也可点击画面选择):").pack(anchor=tk.W, padx=5)
+        self.combo_camera = ttk.Combobox(p1, state="readonly")
+        self.combo_camera.pack(fill=tk.X, padx=5, pady=2)
+        self.combo_camera.bind("<<ComboboxSelected>>", lambda e: self.select_camera(self.combo_camera.get()))
+
         # 2. 采集图像
         p2 = ttk.LabelFrame(self.control_panel, text="数据采集")
         p2.pack(fill=tk.X, pady=5)
 
-        self.lbl_count = ttk.Label(p2, text=f"下一张: chess_{self.snapshot_count:02d}.jpg")
+        self.lbl_count = ttk.Label(p2, text=self._count_text())
         self.lbl_count.pack(pady=5)
 
+        # 保存格式: JPEG (可调质量) 或无损 PNG
+        f_fmt = tk.Frame(p2)
+        f_fmt.pack(fill=tk.X, padx=5)
+        ttk.Label(f_fmt, text="格式:").pack(side=tk.LEFT)
+        self.combo_fmt = ttk.Combobox(f_fmt, state="readonly", width=10, values=["JPEG", "PNG (无损)"])
+        self.combo_fmt.current(0)
+        self.combo_fmt.pack(side=tk.LEFT, padx=5)
+        self.combo_fmt.bind("<<ComboboxSelected>>", lambda e: self._on_format_changed())
+        ttk.Label(f_fmt, text="质量:").pack(side=tk.LEFT)
+        self.spin_quality = ttk.Spinbox(f_fmt, from_=50, to=100, width=5, command=self._on_format_changed)
+        self.spin_quality.set(95)
+        self.spin_quality.pack(side=tk.LEFT, padx=5)
+
+        # 连拍: 按固定间隔采集 N 张
+        f_burst = tk.Frame(p2)
+        f_burst.pack(fill=tk.X, padx=5, pady=2)
+        ttk.Label(f_burst, text="连拍张数:").pack(side=tk.LEFT)
+        self.spin_burst_count = ttk.Spinbox(f_burst, from_=1, to=200, width=5)
+        self.spin_burst_count.set(10)
+        self.spin_burst_count.pack(side=tk.LEFT, padx=2)
+        ttk.Label(f_burst, text="间隔(ms):").pack(side=tk.LEFT)
+        self.spin_burst_interval = ttk.Spinbox(f_burst, from_=50, to=10000, increment=50, width=6)
+        self.spin_burst_interval.set(500)
+        self.spin_burst_interval.pack(side=tk.LEFT, padx=2)
+        self.btn_burst = ttk.Button(f_burst, text="连拍", command=self.toggle_burst)
+        self.btn_burst.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+
+        # 自动采集: 检测到清晰、稳定且位于未覆盖区域的棋盘格时自动保存
+        self.btn_auto = ttk.Button(p2, text="自动采集", command=self.toggle_autocapture)
+        self.btn_auto.pack(fill=tk.X, padx=5, pady=2)
+        self.lbl_auto = ttk.Label(p2, text="", wraplength=260)
+        self.lbl_auto.pack(fill=tk.X, padx=5)
+
         # --- 修改开始：创建一个 Frame 容器来放水平按钮 ---
         f_btns = tk.Frame(p2)
         f_btns.pack(fill=tk.X, padx=5, pady=5)  # 容器占满宽度
@@ -178,6 +345,26 @@ class CameraGUI:
         self.entry_square.insert(0, "20")
         self.entry_square.pack(fill=tk.X, padx=5, pady=5)
 
+        self.var_fast_detect = tk.BooleanVar()
+        ttk.Checkbutton(p3, text="快速角点检测 (缩小图粗搜)", variable=self.var_fast_detect).pack(anchor=tk.W, padx=5)
+
+        # 去掉近似重复的视图，最多保留这么多张参与标定 (0 表示全部使用)
+        f_views = tk.Frame(p3)
+        f_views.pack(fill=tk.X, padx=5)
+        ttk.Label(f_views, text="最多使用视图数 (0=全部):").pack(side=tk.LEFT)
+        self.spin_max_views = ttk.Spinbox(f_views, from_=0, to=500, width=6)
+        self.spin_max_views.set(0)
+        self.spin_max_views.pack(side=tk.LEFT, padx=5)
+
+        # 重投影误差超过阈值的视图剔除后重新标定
+        f_reject = tk.Frame(p3)
+        f_reject.pack(fill=tk.X, padx=5)
+        self.var_reject = tk.BooleanVar()
+        ttk.Checkbutton(f_reject, text="剔除误差超过 (px):", variable=self.var_reject).pack(side=tk.LEFT)
+        self.entry_reject = ttk.Entry(f_reject, width=6)
+        self.entry_reject.insert(0, "1.0")
+        self.entry_reject.pack(side=tk.LEFT, padx=5)
+
         self.btn_calib = ttk.Button(p3, text="开始标定计算", command=self.run_calibration)
         self.btn_calib.pack(fill=tk.X, padx=5, pady=5)
 
@@ -193,6 +380,14 @@ class CameraGUI:
                                            command=self.toggle_rectify)
         self.chk_rectify.pack(pady=10)
 
+        # 性能指标: 叠加在预览画面上，或导出为 CSV / Prometheus 文本
+        f_metrics = tk.Frame(p4)
+        f_metrics.pack(fill=tk.X, padx=5, pady=(0, 5))
+        self.var_overlay = tk.BooleanVar()
+        ttk.Checkbutton(f_metrics, text="显示性能指标", variable=self.var_overlay,
+                        command=self.toggle_overlay).pack(side=tk.LEFT)
+        ttk.Button(f_metrics, text="导出指标", command=self.export_metrics).pack(side=tk.RIGHT)
+
         # --- 5. 运行日志 (新增部分，填补左下角空白) ---
         p5 = ttk.LabelFrame(self.control_panel, text="运行日志")
         # expand=True, fill=tk.BOTH 让它自动撑满剩下的垂直空间
@@ -207,8 +402,9 @@ class CameraGUI:
         self.log_text.tag_config("stderr", foreground="red")  # 错误显示红色
 
         # 重定向 sys.stdout 和 sys.stderr
-        sys.stdout = TextRedirector(self.log_text, "stdout")
-        sys.stderr = TextRedirector(self.log_text, "stderr")
+        self.log_sink = LogSink(self.log_text, max_lines=2000, log_file="ipc_calib.log").start()
+        sys.stdout = TextRedirector(self.log_sink, "stdout")
+        sys.stderr = TextRedirector(self.log_sink, "stderr")
 
         print("系统就绪。日志已重定向至此窗口...")
 
@@ -218,47 +414,121 @@ class CameraGUI:
         """清空截图目录并重置计数器"""
         # 1. 安全确认弹窗
         if not messagebox.askyesno("确认操作",
-                                   "确定要删除所有已采集的截图吗？\n\n此操作将永久删除 ./chess 目录下的所有 jpg 图片，且不可恢复！"):
+                                   "确定要删除所有已采集的截图吗？\n\n此操作将永久删除 ./chess 目录下的所有 jpg/png 图片，且不可恢复！"):
             return
 
         print("正在清空截图目录...")
-
+        self._end_burst()
+        self._stop_autocapture()
+        # 等待取帧和写入可能要数秒，放到后台线程；期间禁用截图相关按钮，避免新截图被一并删除
+        save_dir = self.save_dir
+        buttons = (self.btn_snap, self.btn_burst, self.btn_auto, self.btn_clear)
+        for btn in buttons:
+            btn.config(state=tk.DISABLED)
+
+        def clear_thread():
+            # 等待后台写入完成，避免删除后又写出旧截图
+            self._wait_for_snapshots()
+            deleted_count = self._delete_snapshots(save_dir)
+            self.root.after_idle(lambda: self._on_snapshots_cleared(save_dir, deleted_count, buttons))
+
+        threading.Thread(target=clear_thread, daemon=True).start()
+
+    def _delete_snapshots(self, save_dir):
         # 2. 查找并删除文件
-        files = glob.glob(os.path.join(self.save_dir, "chess_*.jpg"))
-        deleted_count = 0
+        files = list_snapshots(save_dir)
+        deleted_files = []
         for f in files:
             try:
                 os.remove(f)
-                deleted_count += 1
+                deleted_files.append(f)
             except Exception as e:
                 print(f"删除失败 {f}: {e}")
 
+        # 同步清理角点缓存中对应的条目
+        try:
+            cache = CornerCache(save_dir)
+            cache.evict(deleted_files)
+            cache.save()
+        except Exception as e:
+            print(f"角点缓存清理失败: {e}")
+        return len(deleted_files)
+
+    def _on_snapshots_cleared(self, save_dir, deleted_count, buttons):
+        for btn in buttons:
+            btn.config(state=tk.NORMAL)
         # 3. 重置计数器
-        self.snapshot_count = 0
-
-        # 4. 更新 UI 显示
-        self.lbl_count.config(text=f"下一张: chess_{self.snapshot_count:02d}.jpg")
+        self._next_index.pop(save_dir, None)
+        if self.save_dir == save_dir:
+            self.snapshot_count = 0
+            # 4. 更新 UI 显示
+            self.lbl_count.config(text=self._count_text())
 
         print(f"操作完成: 已删除 {deleted_count} 张图片，计数已重置为 0。")
 
-    def start_scan(self):
+    def _load_device_cache(self):
+        devices, fresh = self.device_cache.load()
+        if not devices:
+            return
+        self.device_list = devices
+        self.combo_url['values'] = [d['label'] for d in devices]
+        self.combo_url.current(0)
+        print(f"已从缓存加载 {len(devices)} 个设备")
+        if not fresh:
+            # 缓存过期: 先用旧结果，同时在后台重新扫描
+            print("设备缓存已过期，后台刷新中...")
+            self.start_scan(revalidate=True)
+
+    def _device_url(self, device):
+        # 缓存中不保存密码，连接时按当前输入的账号密码补全
+        return inject_credentials(device['value'], self.entry_user.get(), self.entry_pass.get())
+
+    def start_scan(self, revalidate=False):
         user = self.entry_user.get()
         pwd = self.entry_pass.get()
 
         self.btn_scan.config(state=tk.DISABLED, text="扫描中...")
-        self.combo_url.set("正在扫描...")
-        self.root.update()
+        if not revalidate:
+            self.combo_url.set("正在扫描...")
+            self.root.update()
 
         print(f"正在启动扫描线程 (User: {user})...")  # 这行字现在会显示在左下角
 
-        scanner = DeviceScanner(user, pwd, self.on_scan_finished)
+        if not revalidate:
+            self.device_list = []
+            self.combo_url['values'] = []
+        cidr = self.entry_cidr.get().strip() or None
+        # 扫描模块 (及其 ONVIF 依赖) 只在第一次扫描时导入，不拖慢启动
+        from scanner import DeviceScanner
+        scanner = DeviceScanner(user, pwd, lambda devices: self.on_scan_finished(devices, revalidate),
+                                on_device=self.on_device_found, sweep_cidr=cidr)
         scanner.start()
 
-    def on_scan_finished(self, devices):
-        self.root.after_idle(lambda: self._update_combo(devices))
+    def on_device_found(self, device):
+        # 扫描线程中调用，每解析出一个码流就追加到下拉框
+        self.root.after_idle(lambda: self._append_device(device))
 
-    def _update_combo(self, devices):
-        self.device_list = devices
+    def _append_device(self, device):
+        if any(d['label'] == device['label'] for d in self.device_list):
+            return
+        self.device_list.append(device)
+        self.combo_url['values'] = [d['label'] for d in self.device_list]
+        if len(self.device_list) == 1:
+            self.combo_url.current(0)
+
+    def on_scan_finished(self, devices, revalidate=False):
+        self.device_cache.save(devices)
+        self.root.after_idle(lambda: self._update_combo(devices, revalidate))
+
+    def _update_combo(self, devices, revalidate=False):
+        if revalidate and not any(d.get('host') for d in devices):
+            # 与 DeviceCache.save 一致: 后台刷新没有扫到网络相机 (例如网络尚未就绪) 时保留缓存的设备，
+            # 扫描中发现的 USB 相机已由 _append_device 追加
+            print("后台刷新未发现网络设备，保留缓存的设备列表")
+            self.btn_scan.config(state=tk.NORMAL, text="扫描局域网/USB设备")
+            return
+        self.device_list = list(devices)
+        current = self.combo_url.get()
         labels = [d['label'] for d in devices]
         if not labels:
             labels = ["未发现设备"]
@@ -267,14 +537,34 @@ class CameraGUI:
             print(f"扫描结束: 发现 {len(devices)} 个设备")
 
         self.combo_url['values'] = labels
-        self.combo_url.current(0)
+        if current in labels:
+            self.combo_url.set(current)
+        else:
+            self.combo_url.current(0)
         self.btn_scan.config(state=tk.NORMAL, text="扫描局域网/USB设备")
 
+    def _busy_calibrating(self):
+        if self.calibrating:
+            messagebox.showwarning("提示", "正在标定计算，请等待完成后再切换相机或推流")
+        return self.calibrating
+
     def toggle_stream(self):
+        if self._busy_calibrating():
+            return
+        if self.pool is not None:
+            messagebox.showwarning("提示", "请先断开多路连接")
+            return
         if self.vs is not None:
             print("正在停止推流...")
+            self._stop_autocapture()
+            self.preview.stop()
+            self.preview = None
             self.vs.stop()
             self.vs = None
+            if self.grabber is not None:
+                self.grabber.stop()
+                self.grabber = None
+            self.photo = None
             self.btn_connect.config(text="开始推流", state=tk.NORMAL)
             self.video_panel.config(image='', text="视频停止")
             return
@@ -288,23 +578,41 @@ class CameraGUI:
 
         selection = self.combo_url.get()
         url_to_use = selection
+        self.current_device = None
         for d in self.device_list:
             if d['label'] == selection:
-                url_to_use = d['value']
+                url_to_use = self._device_url(d)
+                self.current_device = d
                 break
 
+        capture_url = None
+        if self.var_substream.get():
+            url_to_use, capture_url, main_resolution = self._resolve_stream_pair(selection, url_to_use)
+            if main_resolution is not None and main_resolution != tuple(self.calibrator.image_size):
+                # 标定以主码流分辨率为准
+                self.calibrator = CameraCalibrator(main_resolution)
+                self.entry_res.delete(0, tk.END)
+                self.entry_res.insert(0, f"{main_resolution[0]}x{main_resolution[1]}")
+        self._auto_load_params(self.current_device, self.calibrator)
+
         print(f"准备连接: {url_to_use}")
         self.btn_connect.config(text="正在连接...", state=tk.DISABLED)
+        # 解码放到子进程时，帧经共享内存传回，避免与界面和矫正争抢 GIL
+        stream_cls = SharedMemoryVideoStream if self.var_process_decode.get() else VideoStream
+        keep_main = self.var_keep_main.get()
 
         def connect_thread():
             try:
                 # 尝试连接，VideoStream start 方法现在会返回 self
-                new_vs = VideoStream(url_to_use).start()
+                new_vs = stream_cls(url_to_use).start()
                 # 简单检查是否真的打开了 (可选)
                 time.sleep(1)
-                if new_vs.cap.isOpened():
+                if new_vs.is_opened():
                     print("连接成功！")
-                    self.root.after_idle(lambda: self._on_stream_started(new_vs))
+                    grabber = None
+                    if capture_url is not None:
+                        grabber = FrameGrabber(capture_url, keep_warm=keep_main).start()
+                    self.root.after_idle(lambda: self._on_stream_started(new_vs, grabber))
                 else:
                     print("连接失败: 无法打开视频源")
                     new_vs.stop()
@@ -315,74 +623,413 @@ class CameraGUI:
 
         threading.Thread(target=connect_thread, daemon=True).start()
 
-    def _on_stream_started(self, new_vs):
+    def _resolve_stream_pair(self, selection, url):
+        """返回 (预览地址, 截图地址, 主码流分辨率)：同一设备中分辨率最低的码流用于预览，最高的用于截图"""
+        device = next((d for d in self.device_list if d['label'] == selection), None)
+        siblings = [d for d in self.device_list if device is not None and d.get('host')
+                    and d.get('host') == device.get('host')]
+        if len(siblings) < 2:
+            print("未找到同一设备的主/子码流，按单码流连接")
+            return url, None, None
+
+        def area(d):
+            # 没有分辨率信息时按码流名称判断
+            if d.get('resolution'):
+                return d['resolution'][0] * d['resolution'][1]
+            return 0 if 'sub' in str(d.get('profile', '')).lower() else 1
+
+        sub = min(siblings, key=area)
+        main = max(siblings, key=area)
+        print(f"预览: {sub['label']}，截图: {main['label']}")
+        resolution = tuple(main['resolution']) if main.get('resolution') else None
+        return self._device_url(sub), self._device_url(main), resolution
+
+    def _auto_load_params(self, device, calibrator):
+        """已知设备 (按序列号和分辨率) 有保存过的标定参数时自动加载"""
+        if not device or not device.get('serial'):
+            return False
+        path = self.registry.find(device['serial'], calibrator.image_size)
+        if path and calibrator.load_params(path):
+            print(f"已自动加载 {device['label']} 的标定参数: {path}")
+            return True
+        return False
+
+    def _on_stream_started(self, new_vs, grabber=None):
         self.vs = new_vs
+        self.grabber = grabber
         self.btn_connect.config(text="停止推流", state=tk.NORMAL)
-        self.update_video_loop()
+        self.start_preview()
 
     def _on_stream_failed(self):
         self.btn_connect.config(text="开始推流", state=tk.NORMAL)
         messagebox.showerror("错误", "无法连接到相机，请检查网络或地址。")
 
-    def update_video_loop(self):
-        if self.vs is None:
+    def start_preview(self):
+        # 矫正、缩放和拼接都在预览线程中完成，主线程只负责贴图
+        self.preview = PreviewWorker(self.vs, self.calibrator, self.on_preview_ready)
+        self.preview.rectify = self.var_rectify.get()
+        self.preview.overlay = self.var_overlay.get()
+        self.preview.panel_size = (self.video_panel.winfo_width(), self.video_panel.winfo_height())
+        self.video_panel.bind("<Configure>", self._on_panel_resized)
+        self.preview.start()
+
+    # --- 多路模式 ---
+
+    def _pool_candidates(self):
+        # 每台设备只连一路码流 (扫描结果中排在前面的，通常是主码流)
+        candidates = []
+        hosts = set()
+        for d in self.device_list:
+            value = d['value']
+            host = value if value.isdigit() else urlparse(value).hostname
+            if not host or host in hosts:
+                continue
+            hosts.add(host)
+            candidates.append(d)
+        return candidates
+
+    def toggle_pool(self):
+        if self._busy_calibrating():
+            return
+        if self.pool is not None:
+            print("正在断开多路连接...")
+            self._stop_autocapture()
+            self.preview.stop()
+            self.preview = None
+            self.pool.close_all()
+            self.pool = None
+            self.vs = None
+            self.photo = None
+            self.save_dir = self.base_save_dir
+            self._update_snapshot_label()
+            self.combo_camera['values'] = []
+            self.combo_camera.set("")
+            self.btn_pool.config(text="多路连接 (全部扫描设备)", state=tk.NORMAL)
+            self.video_panel.config(image='', text="视频停止")
             return
 
-        ret, frame = self.vs.read()
-        if ret and frame is not None:
-            display_frame = frame
+        if self.vs is not None:
+            messagebox.showwarning("提示", "请先停止单路推流")
+            return
+        candidates = self._pool_candidates()
+        if not candidates:
+            messagebox.showwarning("提示", "请先扫描设备")
+            return
+        try:
+            w, h = map(int, self.entry_res.get().lower().split('x'))
+        except:
+            messagebox.showerror("错误", "分辨率格式无效")
+            return
+
+        stream_cls = SharedMemoryVideoStream if self.var_process_decode.get() else VideoStream
+        pool = VideoStreamPool(stream_cls=stream_cls)
+        self.btn_pool.config(text="正在连接...", state=tk.DISABLED)
+        targets = [(d['label'], self._device_url(d)) for d in candidates]
 
-            if self.var_rectify.get() and self.calibrator.is_calibrated:
-                rectified = self.calibrator.rectify_image(frame)
+        def connect_thread():
+            for label, url in targets:
+                print(f"准备连接: {label}")
                 try:
-                    display_frame = cv2.vconcat([frame, rectified])
-                    h = frame.shape[0]
-                    cv2.line(display_frame, (0, h), (frame.shape[1], h), (0, 255, 0), 2)
-                    cv2.putText(display_frame, "Original", (30, 60),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 3)
-                    cv2.putText(display_frame, "Rectified", (30, h + 60),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 3)
-                except:
-                    display_frame = rectified
-
-            # 显示
-            try:
-                cv_image = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
-                panel_w = self.video_panel.winfo_width()
-                panel_h = self.video_panel.winfo_height()
+                    if pool.open(label, url) is None:
+                        print(f"连接失败: {label}")
+                except Exception as e:
+                    print(f"连接异常 {label}: {e}")
+            self.root.after_idle(lambda: self._on_pool_started(pool, (w, h)))
 
-                if panel_w > 10 and panel_h > 10:
-                    pil_image = Image.fromarray(cv_image)
-                    img_w, img_h = pil_image.size
-                    ratio = min(panel_w / img_w, panel_h / img_h)
-                    new_size = (int(img_w * ratio), int(img_h * ratio))
+        threading.Thread(target=connect_thread, daemon=True).start()
 
-                    pil_image = pil_image.resize(new_size, Image.Resampling.LANCZOS)
-                    imgtk = ImageTk.PhotoImage(image=pil_image)
+    def _on_pool_started(self, pool, image_size):
+        names = pool.names()
+        if not names:
+            self.btn_pool.config(text="多路连接 (全部扫描设备)", state=tk.NORMAL)
+            messagebox.showerror("错误", "没有可用的相机。")
+            return
+        print(f"多路连接完成: {len(names)} 路")
+
+        self.pool = pool
+        self.calibrators = {name: self.calibrators.get(name) or CameraCalibrator(image_size) for name in names}
+        for name in names:
+            if not self.calibrators[name].is_calibrated:
+                self._auto_load_params(self._find_device(name), self.calibrators[name])
+        self.btn_pool.config(text="断开多路连接", state=tk.NORMAL)
+        self.combo_camera['values'] = names
+
+        self.preview = MosaicWorker(pool, self.calibrators, self.on_preview_ready)
+        self.preview.rectify = self.var_rectify.get()
+        self.preview.overlay = self.var_overlay.get()
+        self.preview.panel_size = (self.video_panel.winfo_width(), self.video_panel.winfo_height())
+        self.video_panel.bind("<Configure>", self._on_panel_resized)
+        self.video_panel.bind("<Button-1>", self._on_panel_clicked)
+        self.select_camera(names[0])
+        self.preview.start()
+
+    def select_camera(self, name):
+        """多路模式下切换当前相机: 截图、标定和矫正都作用于该相机"""
+        if self.pool is None or self.pool.get(name) is None:
+            return
+        if self._busy_calibrating():
+            self.combo_camera.set(self.preview.selected or "")
+            return
+        self._stop_autocapture()
+        # 采集指标只统计当前相机，与预览叠加的帧率、耗时对应
+        if self.vs is not None:
+            self.vs.record_metrics = False
+        self.vs = self.pool.get(name)
+        self.vs.record_metrics = True
+        self.calibrator = self.calibrators[name]
+        self.current_device = self._find_device(name)
+        self.save_dir = os.path.join(self.base_save_dir, re.sub(r'[^\w.-]+', '_', name).strip('_'))
+        if not os.path.exists(self.save_dir):
+            os.makedirs(self.save_dir)
+        self._update_snapshot_label()
+        self.combo_camera.set(name)
+        self.preview.selected = name
+        if self.var_rectify.get() and not self.calibrator.is_calibrated:
+            self.var_rectify.set(False)
+            self.preview.rectify = False
+        print(f"当前相机: {name} (截图目录: {self.save_dir})")
+
+    def _find_device(self, label):
+        return next((d for d in self.device_list if d['label'] == label), None)
+
+    def _update_snapshot_label(self):
+        self.snapshot_count = self._get_next_index()
+        self.lbl_count.config(text=self._count_text())
 
-                    self.video_panel.imgtk = imgtk
-                    self.video_panel.config(image=imgtk, text="")
-            except Exception as e:
-                print(f"显示错误: {e}")
+    def _on_panel_clicked(self, event):
+        if self.pool is None or self.photo_size is None:
+            return
+        # 图像在 Label 中居中显示，换算到拼图坐标
+        x = event.x - (self.video_panel.winfo_width() - self.photo_size[0]) // 2
+        y = event.y - (self.video_panel.winfo_height() - self.photo_size[1]) // 2
+        name = self.preview.tile_at(x, y)
+        if name is not None:
+            self.select_camera(name)
 
-        self.root.after(30, self.update_video_loop)
+    def _on_panel_resized(self, event):
+        if self.preview is not None:
+            self.preview.panel_size = (event.width, event.height)
+
+    def on_preview_ready(self):
+        # 在预览线程中调用，转交主线程贴图
+        self.root.after(0, self.update_video_loop)
+
+    def update_video_loop(self):
+        if self.preview is None:
+            return
+        image = self.preview.take()
+        if image is None:
+            return
+        try:
+            self._show_image(image)
+        except Exception as e:
+            print(f"显示错误: {e}")
+
+    def _show_image(self, rgb):
+        # PIL 推迟到第一帧显示时导入
+        from PIL import Image, ImageTk
+        # 尺寸不变时复用同一个 PhotoImage，直接写入新像素
+        with metrics.timed(PIL_CONVERT_MS):
+            pil_image = Image.fromarray(rgb)
+        with metrics.timed(TK_DRAW_MS):
+            if self.photo is not None and self.photo_size == pil_image.size:
+                self.photo.paste(pil_image)
+            else:
+                self.photo = ImageTk.PhotoImage(image=pil_image)
+                self.photo_size = pil_image.size
+                self.video_panel.imgtk = self.photo
+                self.video_panel.config(image=self.photo, text="")
+        DISPLAY_FRAMES.inc()
 
     def take_snapshot(self):
         if self.vs is None:
             messagebox.showwarning("提示", "请先启动视频推流")
             return
+        # 直接输入的 JPEG 质量不会触发 Spinbox 的 command，截图前读取一次
+        self._on_format_changed()
+        self._capture_one()
+
+    def _allocate_index(self):
+        # 序号在界面线程中分配，与后台写入的先后无关
+        index = self.snapshot_count
+        self.snapshot_count += 1
+        self._next_index[self.save_dir] = self.snapshot_count
+        self.lbl_count.config(text=self._count_text())
+        return index
+
+    def _capture_one(self):
+        if self.grabber is not None:
+            self._take_main_snapshot()
+            return True
         ret, frame = self.vs.read()
         if ret and frame is not None:
-            file_name = f"chess_{self.snapshot_count:02d}.jpg"
-            save_path = os.path.join(self.save_dir, file_name)
-            cv2.imwrite(save_path, frame)
+            self.writer.submit(frame, self.save_dir, self._allocate_index())
+            return True
+        return False
+
+    def _on_snapshot_saved(self, path, ok):
+        # 在写入线程中调用
+        if ok:
+            print(f"已保存截图: {os.path.basename(path)}")  # 这也会显示在日志窗口
+        else:
+            print(f"截图保存失败: {path}")
+
+    def _on_format_changed(self):
+        self.writer.fmt = 'png' if self.combo_fmt.current() == 1 else 'jpg'
+        try:
+            self.writer.jpeg_quality = int(self.spin_quality.get())
+        except ValueError:
+            pass
+        self.lbl_count.config(text=self._count_text())
+
+    def _take_main_snapshot(self):
+        # 先分配序号，再在后台线程从主码流取帧并交给写入线程
+        index = self._allocate_index()
+        save_dir = self.save_dir
+        grabber = self.grabber
+
+        def grab_thread():
+            frame = grabber.grab()
+            if frame is None:
+                print(f"主码流取帧失败: {snapshot_name(index, self.writer.fmt)}")
+                return
+            self.writer.submit(frame, save_dir, index)
+
+        t = threading.Thread(target=grab_thread, daemon=True)
+        self._pending_grabs = [p for p in self._pending_grabs if p.is_alive()] + [t]
+        t.start()
+
+    def toggle_burst(self):
+        if self.burst_remaining:
+            self._end_burst()
+            print("连拍已停止")
+            return
+        if self.vs is None:
+            messagebox.showwarning("提示", "请先启动视频推流")
+            return
+        try:
+            count = int(self.spin_burst_count.get())
+            interval = int(self.spin_burst_interval.get())
+        except ValueError:
+            messagebox.showerror("错误", "连拍参数无效")
+            return
+        self._on_format_changed()
+        self.burst_remaining = max(1, count)
+        self.btn_burst.config(text="停止连拍")
+        print(f"开始连拍: {self.burst_remaining} 张，间隔 {interval} ms")
+        if self.grabber is None:
+            self._burst_step(interval)
+            return
+
+        # 子码流预览时从主码流取帧: 连拍期间只保持一路主码流连接，连上后再按间隔取帧，
+        # 否则每张各自临时连接，会同时建立多路 RTSP 会话且取到的画面不按间隔
+        grabber = self.grabber
+        max_fps = max(5.0, 1000.0 / interval) if interval > 0 else None
+
+        def warm_thread():
+            if not grabber.warm_up(max_fps=max_fps):
+                print("主码流连接失败，连拍改为每张临时连接")
+            self.root.after_idle(start)
 
-            print(f"已保存截图: {file_name}")  # 这也会显示在日志窗口
+        def start():
+            if self._burst_warm is not None and self._burst_warm[0] is grabber and self.burst_remaining:
+                self._burst_step(interval)
+
+        t = threading.Thread(target=warm_thread, daemon=True)
+        self._burst_warm = (grabber, t)
+        t.start()
+
+    def _burst_step(self, interval):
+        # 用 after 定时触发，每一步只入队一帧，不阻塞界面
+        if not self.burst_remaining or self.vs is None:
+            self._end_burst()
+            return
+        self._capture_one()
+        self.burst_remaining -= 1
+        if self.burst_remaining:
+            self.root.after(interval, self._burst_step, interval)
+        else:
+            self._end_burst()
 
-            self.snapshot_count += 1
-            self.lbl_count.config(text=f"下一张: chess_{self.snapshot_count:02d}.jpg")
+    def _end_burst(self):
+        self.burst_remaining = 0
+        self.btn_burst.config(text="连拍")
+        if self._burst_warm is None:
+            return
+        # 等预热和已发出的取帧结束后再断开主码流连接
+        (grabber, warm), self._burst_warm = self._burst_warm, None
+        pending = list(self._pending_grabs)
+
+        def cool_down_thread():
+            warm.join()
+            for t in pending:
+                t.join()
+            grabber.cool_down()
+
+        threading.Thread(target=cool_down_thread, daemon=True).start()
+
+    def toggle_autocapture(self):
+        if self.autocapture is not None:
+            self._stop_autocapture()
+            print("自动采集已停止")
+            return
+        if self.vs is None:
+            messagebox.showwarning("提示", "请先启动视频推流")
+            return
+        try:
+            w, h = map(int, self.entry_corners.get().lower().split('x'))
+        except ValueError:
+            messagebox.showerror("错误", "角点数设置无效")
+            return
+        self._on_format_changed()
+        # 与标定时的 pattern_size 保持一致
+        self.autocapture = AutoCaptureWorker(self.vs, (h, w), self._on_auto_capture, self._on_auto_progress)
+        self.autocapture.start()
+        self.btn_auto.config(text="停止自动采集")
+        self.lbl_auto.config(text="等待棋盘格...")
+        print("自动采集已开始: 请在画面各处以不同距离、角度展示棋盘格并保持静止")
+
+    def _stop_autocapture(self):
+        if self.autocapture is not None:
+            self.autocapture.stop()
+            self.autocapture = None
+        self.btn_auto.config(text="自动采集")
+
+    def _on_auto_capture(self, frame):
+        # 在采集线程中调用，序号分配和入队交给界面线程
+        worker = self.autocapture
+        save_dir = self.save_dir
+        if worker is None:
+            return
+
+        def submit():
+            if self.autocapture is not worker:
+                return
+            if self.grabber is not None:
+                # 子码流预览时检测帧分辨率低于标定分辨率，与手动截图一样改从主码流取帧；
+                # 自动采集只在棋盘格静止数帧后触发，稍晚取到的主码流画面与检测帧一致
+                self._take_main_snapshot()
+            else:
+                self.writer.submit(frame, save_dir, self._allocate_index())
+
+        self.root.after(0, submit)
+
+    def _on_auto_progress(self, text, done):
+        worker = self.autocapture
+
+        def update():
+            if self.autocapture is not worker:
+                return
+            self.lbl_auto.config(text=text)
+            if done:
+                self._stop_autocapture()
+                print(f"视角覆盖已足够，自动采集结束 ({text})")
+
+        self.root.after(0, update)
 
     def run_calibration(self):
+        if self.calibrating:
+            return
         if self.calibrator is None:
             messagebox.showerror("错误", "请先启动视频流以初始化图像尺寸。")
             return
@@ -391,6 +1038,8 @@ class CameraGUI:
             corner_str = self.entry_corners.get()
             w, h = map(int, corner_str.lower().split('x'))
             square = int(self.entry_square.get())
+            max_views = int(self.spin_max_views.get())
+            outlier_threshold = float(self.entry_reject.get()) if self.var_reject.get() else None
         except:
             messagebox.showerror("错误", "标定参数无效")
             return
@@ -399,20 +1048,51 @@ class CameraGUI:
         self.btn_calib.config(state=tk.DISABLED, text="正在计算中...")
         print("--- 开始标定计算，请耐心等待 ---")
 
-        threading.Thread(target=self._calibration_thread_worker, args=(w, h, square), daemon=True).start()
-
-    def _calibration_thread_worker(self, w, h, square):
+        # 4K 画面缩小 4 倍、其余缩小 2 倍做粗搜
+        downscale = 1
+        if self.var_fast_detect.get():
+            downscale = 4 if self.calibrator.image_size[0] >= 3000 else 2
+
+        # 标定对象、截图目录和设备在发起时确定，结果只写回这台相机
+        self.calibrating = True
+        target = (self.calibrator, self.save_dir, self.current_device)
+        threading.Thread(target=self._calibration_thread_worker,
+                         args=(target, w, h, square, downscale, max_views, outlier_threshold), daemon=True).start()
+
+    def _calibration_thread_worker(self, target, w, h, square, downscale=1, max_views=0, outlier_threshold=None):
+        calibrator, save_dir, device = target
+        # 连拍的最后几张可能还在队列中，未写完的文件会被当作无法读取或 "无棋盘格" 存进角点缓存
+        self._wait_for_snapshots()
         # 这里的 print 输出会实时显示在日志窗口
-        success = self.calibrator.calibration(corner_height=h, corner_width=w, square_size=square,
-                                              image_dir=self.save_dir)
-        self.root.after_idle(lambda: self._on_calibration_finished(success))
-
-    def _on_calibration_finished(self, success):
+        try:
+            success = calibrator.calibration(corner_height=h, corner_width=w, square_size=square,
+                                             image_dir=save_dir, downscale=downscale,
+                                             max_views=max_views or None,
+                                             outlier_threshold=outlier_threshold)
+        except Exception as e:
+            print(f"标定出错: {e}")
+            success = False
+        self.root.after_idle(lambda: self._on_calibration_finished(target, success))
+
+    def _on_calibration_finished(self, target, success):
+        calibrator, _, device = target
+        self.calibrating = False
         self.root.config(cursor="")
         self.btn_calib.config(state=tk.NORMAL, text="开始标定计算")
 
         if success:
-            self.calibrator.save_params()
+            calibrator.save_params()
+            # 同时按设备序列号登记，下次连接该相机时自动加载
+            if device and device.get('serial'):
+                path = self.registry.store(calibrator, device['serial'])
+                print(f"标定参数已登记: {path}")
+            # 列出误差最大的几张图，便于人工检查
+            worst = sorted(calibrator.view_errors, key=lambda v: -v['rms'])[:5]
+            for v in worst:
+                print(f"  {os.path.basename(v['file'])}: {v['rms']:.3f} px{'' if v['used'] else ' (已剔除)'}")
+            stats = calibrator.stats
+            print(f"视图: 检测到 {stats['detected']} 张, 筛选后 {stats['selected']} 张, 最终使用 {stats['used']} 张; "
+                  f"检测 {stats['detect_s']:.1f} s, 筛选 {stats['select_s']:.2f} s, 筛选+求解 {stats['calibrate_s']:.1f} s")
             print(f"标定成功! RMS: {success}")
             messagebox.showinfo("成功", f"标定完成。\nRMS: {success}")
         else:
@@ -427,7 +1107,8 @@ class CameraGUI:
             except:
                 messagebox.showerror("错误", "请检查分辨率")
                 return
-        file_path = filedialog.askopenfilename(filetypes=[("XML files", "*.xml")])
+        file_path = filedialog.askopenfilename(filetypes=[("Params", "*.xml *.npz"), ("XML files", "*.xml"),
+                                                          ("NPZ files", "*.npz")])
         if file_path:
             if self.calibrator.load_params(file_path):
                 print(f"参数已加载: {file_path}")
@@ -436,6 +1117,21 @@ class CameraGUI:
                 print("参数加载失败")
                 messagebox.showerror("错误", "参数加载失败")
 
+    def toggle_overlay(self):
+        if self.preview is not None:
+            self.preview.overlay = self.var_overlay.get()
+
+    def export_metrics(self):
+        path = filedialog.asksaveasfilename(defaultextension=".prom",
+                                            filetypes=[("Prometheus text", "*.prom"), ("CSV", "*.csv")])
+        if not path:
+            return
+        try:
+            metrics.REGISTRY.export(path)
+            print(f"性能指标已导出: {path}")
+        except OSError as e:
+            messagebox.showerror("错误", f"导出失败: {e}")
+
     def toggle_rectify(self):
         if self.var_rectify.get():
             if not self.calibrator or not self.calibrator.is_calibrated:
@@ -446,9 +1142,15 @@ class CameraGUI:
                 print("开启畸变矫正预览")
         else:
             print("关闭畸变矫正预览")
+        if self.preview is not None:
+            self.preview.rectify = self.var_rectify.get()
 
 
 if __name__ == "__main__":
+    # 打包后的程序启动角点检测进程池时需要
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = CameraGUI(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    # 关闭窗口后等待排队中的截图写完再退出
+    app.writer.flush()
@@ -0,0 +1,196 @@
+import bisect
+import csv
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 轻量级运行指标: 计数器、瞬时值和直方图，可导出为 CSV 或 Prometheus 文本格式。
+# 记录一次只是加锁后更新几个数字，可以放在每帧都会执行的路径上。
+
+DEFAULT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)  # 毫秒
+SECONDS_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+
+
+class Counter(object):
+    """单调递增的计数器，额外保留最近的事件时刻用于计算速率 (如采集帧率)"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text='', window=1024):
+        super(Counter, self).__init__()
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._times = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+            self._times.append(time.monotonic())
+
+    def rate(self, window=2.0):
+        """最近 window 秒内的每秒事件数"""
+        now = time.monotonic()
+        with self._lock:
+            recent = sum(1 for t in self._times if now - t <= window)
+        return recent / window
+
+
+class Gauge(object):
+    kind = 'gauge'
+
+    def __init__(self, name, help_text=''):
+        super(Gauge, self).__init__()
+        self.name = name
+        self.help = help_text
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram(object):
+    """累计分桶计数 (用于导出) + 最近若干个样本 (用于叠加显示的均值和分位数)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text='', buckets=DEFAULT_BUCKETS, window=240):
+        super(Histogram, self).__init__()
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一格为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self._recent.append(value)
+
+    def recent(self):
+        with self._lock:
+            return sorted(self._recent)
+
+    def summary(self):
+        """最近样本的 (均值, p50, p95)，没有样本时返回 None"""
+        values = self.recent()
+        if not values:
+            return None
+        n = len(values)
+        return sum(values) / n, values[n // 2], values[min(n - 1, int(n * 0.95))]
+
+
+class Registry(object):
+    def __init__(self):
+        super(Registry, self).__init__()
+        self.metrics = dict()
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name, help_text=''):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text=''):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text='', buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def items(self):
+        with self._lock:
+            return sorted(self.metrics.items())
+
+    def export_prometheus(self, path):
+        lines = []
+        for name, m in self.items():
+            if m.help:
+                lines.append("# HELP {} {}".format(name, m.help))
+            lines.append("# TYPE {} {}".format(name, m.kind))
+            if m.kind == 'histogram':
+                cumulative = 0
+                for le, n in zip(list(m.buckets) + ['+Inf'], m.counts):
+                    cumulative += n
+                    lines.append('{}_bucket{{le="{}"}} {}'.format(name, le, cumulative))
+                lines.append("{}_sum {}".format(name, m.sum))
+                lines.append("{}_count {}".format(name, m.count))
+            else:
+                lines.append("{} {}".format(name, m.value))
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+
+    def export_csv(self, path):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'type', 'value', 'count', 'sum', 'recent_mean', 'recent_p50', 'recent_p95'])
+            for name, m in self.items():
+                if m.kind == 'histogram':
+                    s = m.summary() or ('', '', '')
+                    writer.writerow([name, m.kind, '', m.count, m.sum] + list(s))
+                else:
+                    writer.writerow([name, m.kind, m.value, '', '', '', '', ''])
+
+    def export(self, path):
+        """按扩展名选择格式: .csv 为 CSV，其余为 Prometheus 文本格式"""
+        if path.lower().endswith('.csv'):
+            self.export_csv(path)
+        else:
+            self.export_prometheus(path)
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text=''):
+    return REGISTRY.counter(name, help_text)
+
+
+def gauge(name, help_text=''):
+    return REGISTRY.gauge(name, help_text)
+
+
+def histogram(name, help_text='', buckets=DEFAULT_BUCKETS):
+    return REGISTRY.histogram(name, help_text, buckets)
+
+
+@contextmanager
+def timed(hist, scale=1000.0):
+    """把代码块耗时记入直方图，默认单位毫秒 (scale=1 为秒)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        hist.observe((time.perf_counter() - start) * scale)
+
+
+def overlay_lines(registry=REGISTRY):
+    """叠加显示用的几行摘要: 采集帧率、帧龄和各阶段耗时"""
+    lines = []
+    captured = registry.metrics.get('capture_frames_total')
+    displayed = registry.metrics.get('display_frames_total')
+    if captured is not None or displayed is not None:
+        lines.append("capture {:.1f} fps  display {:.1f} fps".format(
+            captured.rate() if captured else 0.0, displayed.rate() if displayed else 0.0))
+    dropped = registry.metrics.get('preview_dropped_frames_total')
+    if dropped is not None and dropped.value:
+        lines.append("preview dropped: {} frames".format(dropped.value))
+    for name in ('frame_age_ms', 'capture_read_ms', 'rectify_ms', 'preview_render_ms',
+                 'pil_convert_ms', 'tk_draw_ms'):
+        m = registry.metrics.get(name)
+        s = m.summary() if m is not None else None
+        if s is not None:
+            # Hershey 字体不等宽，不做列对齐
+            lines.append("{}: avg {:.1f} ms, p95 {:.1f} ms".format(name[:-3], s[0], s[2]))
+    return lines
@@ -0,0 +1,294 @@
+import cv2
+import math
+import threading
+import time
+import numpy as np
+import metrics
+
+FRAME_AGE_MS = metrics.histogram('frame_age_ms', '预览线程开始处理时帧已存在的时间 (毫秒)')
+RECTIFY_MS = metrics.histogram('rectify_ms', '预览矫正 remap 耗时 (毫秒)')
+RENDER_MS = metrics.histogram('preview_render_ms', '预览线程生成一帧显示图像的总耗时 (毫秒)')
+DROPPED_FRAMES = metrics.counter('preview_dropped_frames_total', '预览来不及处理而跳过的帧数')
+OVERLAY_INTERVAL = 0.5  # 叠加信息的刷新间隔 (秒)
+
+
+def draw_overlay(image, lines):
+    """在显示图像左下角绘制半透明底色的指标文字 (原地修改)"""
+    if not lines:
+        return image
+    line_h = 18
+    h = line_h * len(lines) + 8
+    y0 = max(0, image.shape[0] - h)
+    w = min(image.shape[1], 380)
+    region = image[y0:, :w]
+    region[:] = region // 3
+    for i, text in enumerate(lines):
+        cv2.putText(image, text, (6, y0 + 16 + i * line_h), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 0), 1)
+    return image
+
+
+def fit_size(img_w, img_h, panel_w, panel_h):
+    """按比例缩放到面板内的最大尺寸 (宽, 高)"""
+    ratio = min(panel_w / img_w, panel_h / img_h)
+    return max(1, int(img_w * ratio)), max(1, int(img_h * ratio))
+
+
+def _resize(img, size):
+    if (img.shape[1], img.shape[0]) == size:
+        return img
+    # 先按整数倍 INTER_AREA 缩小 (OpenCV 对整数倍有快速路径，且能抗混叠避免棋盘格摩尔纹)，
+    # 剩余的非整数比例再用 INTER_LINEAR 完成
+    factor = min(img.shape[1] // size[0], img.shape[0] // size[1])
+    if factor >= 2:
+        img = cv2.resize(img, (img.shape[1] // factor, img.shape[0] // factor), interpolation=cv2.INTER_AREA)
+    return cv2.resize(img, size, interpolation=cv2.INTER_LINEAR)
+
+
+def mosaic_layout(count, panel_size):
+    """多路拼图的 (列数, 行数, 单格宽, 单格高)"""
+    cols = max(1, int(math.ceil(math.sqrt(count))))
+    rows = max(1, int(math.ceil(count / cols)))
+    return cols, rows, max(1, panel_size[0] // cols), max(1, panel_size[1] // rows)
+
+
+def compose_preview(frame, rectified, panel_size):
+    """先缩放到面板尺寸，再拼接、画标注并转为 RGB，返回可直接显示的图像
+
+    rectified 为 None 时只显示原图，否则上下拼接 Original/Rectified 对比图。
+    """
+    panel_w, panel_h = panel_size
+    h, w = frame.shape[:2]
+
+    if rectified is None:
+        display = _resize(frame, fit_size(w, h, panel_w, panel_h))
+        return cv2.cvtColor(display, cv2.COLOR_BGR2RGB)
+
+    # 两幅图各占一半高度，统一缩放到相同宽度
+    half = pair_size(w, h, panel_size)
+    return compose_pair(_resize(frame, half), _resize(rectified, half))
+
+
+def pair_size(img_w, img_h, panel_size):
+    """上下对比图中单幅图像的显示尺寸"""
+    size = fit_size(img_w, img_h * 2, panel_size[0], panel_size[1])
+    return size[0], max(1, size[1] // 2)
+
+
+def compose_pair(top, bottom):
+    """拼接两幅同尺寸的显示图像并画标注，返回 RGB 图像"""
+    half = (top.shape[1], top.shape[0])
+    display = cv2.vconcat([top, bottom])
+
+    # 标注按显示分辨率绘制，字号随画面大小变化
+    scale = max(0.4, half[1] / 720.0)
+    thickness = max(1, int(round(2 * scale)))
+    y = half[1]
+    cv2.line(display, (0, y), (half[0], y), (0, 255, 0), thickness)
+    cv2.putText(display, "Original", (int(20 * scale), int(40 * scale)),
+                cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 255), thickness)
+    cv2.putText(display, "Rectified", (int(20 * scale), y + int(40 * scale)),
+                cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 255), thickness)
+    return cv2.cvtColor(display, cv2.COLOR_BGR2RGB)
+
+
+class PreviewWorker(threading.Thread):
+    """在后台线程完成矫正、缩放、拼接和颜色转换，GUI 线程只负责贴图
+
+    结果放在单槽缓冲中，新结果直接覆盖未取走的旧结果 (只保留最新一帧)。
+    """
+
+    def __init__(self, vs, calibrator, on_ready):
+        super().__init__()
+        self.daemon = True
+        self.vs = vs
+        self.calibrator = calibrator
+        self.on_ready = on_ready  # 槽位由空变满时调用 (在工作线程中)
+        # 以下两项由 GUI 线程写入，工作线程只读
+        self.panel_size = (0, 0)
+        self.rectify = False
+        self.overlay = False  # 是否叠加显示性能指标
+        self.stopped = False
+        # 按本预览的读取进度统计跳过的帧数 (同一路流可能还有自动采集等其他消费者)
+        self.dropped_frames = 0
+        self._overlay_lines = []
+        self._overlay_time = 0.0
+        self._slot = None
+        self._slot_lock = threading.Lock()
+
+    def run(self):
+        last_seq = 0
+        while not self.stopped:
+            latest = self.vs.wait_for_frame(last_seq, timeout=0.5)
+            if latest is None:
+                if self.vs.stopped:
+                    break
+                self._show_stream_status()
+                continue
+            self._count_frame(last_seq, latest[0])
+            last_seq, timestamp, frame = latest
+            FRAME_AGE_MS.observe((time.monotonic() - timestamp) * 1000.0)
+
+            panel_w, panel_h = self.panel_size
+            if panel_w <= 10 or panel_h <= 10:
+                continue
+            try:
+                with metrics.timed(RENDER_MS):
+                    image = self.render(frame, (panel_w, panel_h))
+            except Exception as e:
+                print(f"预览处理错误: {e}")
+                continue
+            self._publish(image)
+
+    def _count_frame(self, prev_seq, seq):
+        if prev_seq and seq > prev_seq + 1:
+            self.dropped_frames += seq - prev_seq - 1
+            DROPPED_FRAMES.inc(seq - prev_seq - 1)
+
+    def _show_stream_status(self):
+        # 断流重连期间没有新帧，在最后一帧上标出连接状态，避免看起来像界面卡死
+        state = getattr(self.vs, 'state', 'streaming')
+        if state == 'streaming':
+            return
+        _, frame = self.vs.read()
+        panel_w, panel_h = self.panel_size
+        if frame is None or panel_w <= 10 or panel_h <= 10:
+            return
+        try:
+            image = self.render(frame, (panel_w, panel_h))
+        except Exception as e:
+            print(f"预览处理错误: {e}")
+            return
+        self._publish(image, status="stream {}, reconnects: {}".format(state, self.vs.reconnects))
+
+    def _publish(self, image, status=None):
+        lines = []
+        if self.overlay:
+            # 摘要每隔一段时间才重新计算，每帧只需绘制文字
+            now = time.monotonic()
+            if now - self._overlay_time > OVERLAY_INTERVAL:
+                self._overlay_lines = metrics.overlay_lines()
+                self._overlay_time = now
+            lines = self._overlay_lines
+        if status:
+            # Hershey 字体只支持 ASCII，状态文字用英文
+            lines = lines + [status]
+        draw_overlay(image, lines)
+        with self._slot_lock:
+            was_empty = self._slot is None
+            self._slot = image
+        if was_empty:
+            self.on_ready()
+
+    def render(self, frame, panel_size):
+        calibrator = self.calibrator
+        if not self.rectify or calibrator is None or not calibrator.is_calibrated:
+            return compose_preview(frame, None, panel_size)
+
+        # 先用 INTER_AREA 缩到显示尺寸再矫正: 直接从全分辨率双线性 remap 到小尺寸会有混叠 (棋盘格摩尔纹)，
+        # 且与上半幅原图的缩放方式不一致；remap 也只需处理显示所需的像素
+        h, w = frame.shape[:2]
+        top = _resize(frame, pair_size(w, h, panel_size))
+        with metrics.timed(RECTIFY_MS):
+            rectified = calibrator.rectify_image(top)
+        return compose_pair(top, rectified)
+
+    def take(self):
+        """取走最新的显示图像 (RGB)，没有新图像时返回 None"""
+        with self._slot_lock:
+            image, self._slot = self._slot, None
+        return image
+
+    def stop(self):
+        self.stopped = True
+
+
+class MosaicWorker(PreviewWorker):
+    """多路拼图预览: 每路新帧只缩放一次到格子大小，选中的相机可显示矫正结果"""
+
+    def __init__(self, pool, calibrators, on_ready, interval=0.04):
+        super().__init__(None, None, on_ready)
+        self.pool = pool
+        self.calibrators = calibrators  # 名字 -> CameraCalibrator
+        self.interval = interval
+        self.selected = None  # 由 GUI 线程写入
+        self.layout = (1, 1, 1, 1)
+        self._tiles = dict()  # 名字 -> (帧序号, 格子尺寸, 是否矫正, 缩放后的图像)
+
+    def run(self):
+        while not self.stopped:
+            time.sleep(self.interval)
+            panel_w, panel_h = self.panel_size
+            streams = self.pool.items()
+            if panel_w <= 10 or panel_h <= 10 or not streams:
+                continue
+            try:
+                with metrics.timed(RENDER_MS):
+                    image = self.render_mosaic(streams, (panel_w, panel_h))
+            except Exception as e:
+                print(f"拼图预览错误: {e}")
+                continue
+            if image is not None:
+                self._publish(image)
+
+    def _tile(self, name, vs, cell):
+        # 没有新帧且格子大小不变时直接复用上一次缩放的结果
+        seq, _, frame = vs.read_frame()
+        rectify = self.rectify and name == self.selected
+        cached = self._tiles.get(name)
+        if cached is not None:
+            self._count_frame(cached[0], seq)
+        if cached is not None and cached[:3] == (seq, cell, rectify):
+            return cached[3], False
+        if frame is None:
+            return None, False
+
+        h, w = frame.shape[:2]
+        size = fit_size(w, h, cell[0], cell[1])
+        calibrator = self.calibrators.get(name)
+        tile = _resize(frame, size)
+        if rectify and calibrator is not None and calibrator.is_calibrated:
+            # 与单路预览相同，先缩放再按格子尺寸的映射表矫正
+            with metrics.timed(RECTIFY_MS):
+                tile = calibrator.rectify_image(tile)
+        self._tiles[name] = (seq, cell, rectify, tile)
+        return tile, True
+
+    def render_mosaic(self, streams, panel_size):
+        cols, rows, cell_w, cell_h = mosaic_layout(len(streams), panel_size)
+        self.layout = (cols, rows, cell_w, cell_h)
+
+        tiles = []
+        changed = False
+        for name, vs in streams:
+            tile, updated = self._tile(name, vs, (cell_w, cell_h))
+            tiles.append((name, tile))
+            changed = changed or updated
+        # 去掉已关闭的流
+        for name in set(self._tiles) - set(name for name, _ in streams):
+            del self._tiles[name]
+        if not changed:
+            return None
+
+        canvas = np.zeros((rows * cell_h, cols * cell_w, 3), np.uint8)
+        for i, (name, tile) in enumerate(tiles):
+            x0, y0 = (i % cols) * cell_w, (i // cols) * cell_h
+            if tile is not None:
+                th, tw = tile.shape[:2]
+                ox, oy = x0 + (cell_w - tw) // 2, y0 + (cell_h - th) // 2
+                canvas[oy:oy + th, ox:ox + tw] = tile
+            color = (0, 255, 0) if name == self.selected else (90, 90, 90)
+            cv2.rectangle(canvas, (x0, y0), (x0 + cell_w - 1, y0 + cell_h - 1), color, 2)
+            # Hershey 字体不支持中文，只标注序号和 ASCII 部分
+            label = "#{} {}".format(i + 1, "".join(c for c in name if ord(c) < 128).strip())
+            cv2.putText(canvas, label, (x0 + 8, y0 + 22), cv2.FONT_HERSHEY_SIMPLEX, 0.55, color, 1)
+        return cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB)
+
+    def tile_at(self, x, y):
+        """根据拼图内的坐标返回对应的流名字"""
+        cols, rows, cell_w, cell_h = self.layout
+        col, row = int(x // cell_w), int(y // cell_h)
+        names = self.pool.names()
+        index = row * cols + col
+        if 0 <= col < cols and 0 <= index < len(names):
+            return names[index]
+        return None
@@ -1,71 +1,373 @@
 import cv2
+import asyncio
+import errno
+import ipaddress
+import os
+import sys
+import struct
 import threading
 import socket
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from urllib.parse import urlparse
+from device_registry import inject_credentials
+import metrics
+
+
+def _scan_timer(phase):
+    # 每个扫描阶段一个直方图: scan_usb_seconds、scan_onvif_seconds ...
+    hist = metrics.histogram(f'scan_{phase}_seconds', f'设备扫描 {phase} 阶段耗时 (秒)', metrics.SECONDS_BUCKETS)
+    return metrics.timed(hist, scale=1.0)
 
 # --- 增强的容错导入 ---
-try:
-    import netifaces
-    from onvif import ONVIFCamera
-    from wsdiscovery import WSDiscovery, Scope
+# onvif/zeep/WSDiscovery 加起来导入要上百毫秒，推迟到第一次扫描时在扫描线程中加载
+SCAN_DEPENDENCIES_OK = None  # None 表示尚未尝试导入
+
+
+def load_scan_dependencies():
+    """导入局域网扫描所需的库，结果缓存在 SCAN_DEPENDENCIES_OK 中"""
+    global SCAN_DEPENDENCIES_OK, netifaces, ONVIFCamera, WSDiscovery, Scope, Transport
+    if SCAN_DEPENDENCIES_OK is not None:
+        return SCAN_DEPENDENCIES_OK
+    try:
+        import netifaces
+        from onvif import ONVIFCamera
+        from wsdiscovery import WSDiscovery, Scope
+        from zeep.transports import Transport
 
-    SCAN_DEPENDENCIES_OK = True
-except ImportError as e:
-    print(f"警告: 缺少扫描所需的库 ({e})，局域网扫描功能将不可用。")
-    print("请运行: pip install onvif-zeep netifaces WSDiscovery")
-    SCAN_DEPENDENCIES_OK = False
+        SCAN_DEPENDENCIES_OK = True
+    except ImportError as e:
+        print(f"警告: 缺少扫描所需的库 ({e})，局域网扫描功能将不可用。")
+        print("请运行: pip install onvif-zeep netifaces WSDiscovery")
+        SCAN_DEPENDENCIES_OK = False
+    return SCAN_DEPENDENCIES_OK
 
 
 # --------------------
 
+# Linux V4L2: VIDIOC_QUERYCAP = _IOR('V', 0, struct v4l2_capability)，结构体共 104 字节
+VIDIOC_QUERYCAP = 0x80685600
+V4L2_CAPABILITY_FORMAT = "16s32s32sIII12x"
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_VIDEO_CAPTURE_MPLANE = 0x00001000
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+
+
+def query_v4l2_capture_devices(max_index=10):
+    """读取 /dev/video* 的 V4L2 能力，返回 {索引: 设备名}，只包含支持视频采集的节点
+
+    不依赖 OpenCV，不存在的索引和元数据节点 (UVC 相机通常每台有两个节点) 会被直接跳过。
+    非 Linux 系统返回 None。
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    import fcntl
+
+    devices = dict()
+    for i in range(max_index):
+        path = f"/dev/video{i}"
+        if not os.path.exists(path):
+            continue
+        try:
+            fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        except OSError:
+            continue
+        try:
+            buf = bytearray(struct.calcsize(V4L2_CAPABILITY_FORMAT))
+            fcntl.ioctl(fd, VIDIOC_QUERYCAP, buf)
+            driver, card, bus, version, caps, device_caps = struct.unpack(V4L2_CAPABILITY_FORMAT, buf)
+            if caps & V4L2_CAP_DEVICE_CAPS:
+                caps = device_caps
+            if caps & (V4L2_CAP_VIDEO_CAPTURE | V4L2_CAP_VIDEO_CAPTURE_MPLANE):
+                devices[i] = card.split(b"\0", 1)[0].decode("utf-8", "replace")
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+    return devices
+
+
+# --- 主动网段扫描 (WS-Discovery 的补充，适用于跨 VLAN 或组播被过滤的网络) ---
+ONVIF_PORTS = (80, 8000)
+RTSP_PORTS = (554,)
+
+# 无需鉴权的 GetSystemDateAndTime 请求，用来确认端口上确实是 ONVIF 服务而不是普通网页
+ONVIF_PROBE_BODY = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope">'
+    '<s:Body><GetSystemDateAndTime xmlns="http://www.onvif.org/ver10/device/wsdl"/></s:Body>'
+    '</s:Envelope>'
+)
+
+
+class RateLimiter(object):
+    """简单的令牌桶，限制每秒发起的连接数"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_time = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            if self.next_time > now:
+                await asyncio.sleep(self.next_time - now)
+                now = self.next_time
+            self.next_time = now + self.interval
+
+
+# 文件描述符耗尽: 说明并发过高而不是目标没有服务，不能当作 "没有设备"
+FD_EXHAUSTED_ERRNOS = (errno.EMFILE, errno.ENFILE)
+
+
+def _open_fd_count():
+    for path in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return None
+
+
+def max_sweep_concurrency(requested, margin=64):
+    """按进程可打开的文件数上限 (RLIMIT_NOFILE) 限制同时进行的连接数
+
+    软限制不够时先尝试提高到硬限制；Linux 默认软限制为 1024，GUI 自身还占用一部分描述符。
+    没有 resource 模块的平台 (Windows) 原样返回。
+    """
+    try:
+        import resource
+    except ImportError:
+        return requested
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    in_use = _open_fd_count()
+    if in_use is None:
+        in_use, margin = 0, margin + 256  # 无法统计时多留余量
+    wanted = requested + in_use + margin
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        new_soft = wanted if hard == resource.RLIM_INFINITY else min(hard, wanted)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+            soft = new_soft
+        except (ValueError, OSError):
+            pass
+    if soft == resource.RLIM_INFINITY:
+        return requested
+    return max(1, min(requested, soft - in_use - margin))
+
+
+async def _exchange(host, port, request, timeout):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(request)
+        await writer.drain()
+        return await asyncio.wait_for(reader.read(4096), timeout)
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def probe_onvif(host, port, timeout=1.0):
+    body = ONVIF_PROBE_BODY.encode("utf-8")
+    request = (
+        f"POST /onvif/device_service HTTP/1.1\r\nHost: {host}:{port}\r\n"
+        f"Content-Type: application/soap+xml; charset=utf-8\r\nContent-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n"
+    ).encode("ascii") + body
+    try:
+        response = await _exchange(host, port, request, timeout)
+    except asyncio.TimeoutError:
+        return False
+    except OSError as e:
+        if e.errno in FD_EXHAUSTED_ERRNOS:
+            raise
+        return False
+    return response.startswith(b"HTTP/") and b"Envelope" in response
+
+
+async def probe_rtsp(host, port, timeout=1.0):
+    request = f"OPTIONS rtsp://{host}:{port}/ RTSP/1.0\r\nCSeq: 1\r\n\r\n".encode("ascii")
+    try:
+        response = await _exchange(host, port, request, timeout)
+    except asyncio.TimeoutError:
+        return False
+    except OSError as e:
+        if e.errno in FD_EXHAUSTED_ERRNOS:
+            raise
+        return False
+    return response.startswith(b"RTSP/1.0")
+
+
+async def sweep_async(cidr, onvif_ports=ONVIF_PORTS, rtsp_ports=RTSP_PORTS, concurrency=1000, rate=2000,
+                      timeout=1.0):
+    """并发探测网段内的 ONVIF / RTSP 端口，返回 [(ip, port, 'onvif' 或 'rtsp'), ...]
+
+    concurrency 为同时进行的连接数上限 (不超过进程可打开的文件数)，rate 为每秒新建连接数上限。
+    """
+    limit = max_sweep_concurrency(concurrency)
+    if limit < concurrency:
+        print(f"可打开的文件数不足，网段扫描并发数由 {concurrency} 降为 {limit}")
+        concurrency = limit
+    network = ipaddress.ip_network(cidr, strict=False)
+    probes = [(port, probe_onvif, "onvif") for port in onvif_ports] + \
+             [(port, probe_rtsp, "rtsp") for port in rtsp_ports]
+    # 用迭代器按需生成任务，避免大网段一次性创建几十万个协程
+    jobs = ((str(ip), port, probe, kind) for ip in network.hosts() for port, probe, kind in probes)
+    limiter = RateLimiter(rate)
+    found = []
+
+    async def worker():
+        for host, port, probe, kind in jobs:
+            await limiter.acquire()
+            for attempt in range(3):
+                try:
+                    ok = await probe(host, port, timeout)
+                    break
+                except OSError:
+                    # 描述符耗尽 (如界面同时打开了视频流): 等其他连接关闭后重试，仍失败则中止本网段扫描
+                    if attempt == 2:
+                        raise
+                    await asyncio.sleep(0.2 * (attempt + 1))
+            if ok:
+                found.append((host, port, kind))
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    found.sort(key=lambda item: (ipaddress.ip_address(item[0]), item[1]))
+    return found
+
+
+def sweep_subnet(cidr, **kwargs):
+    """同步封装，可在扫描线程中直接调用"""
+    return asyncio.run(sweep_async(cidr, **kwargs))
+
+
+def local_subnets():
+    """本机各 IPv4 网卡所在的 /24 网段"""
+    subnets = []
+    if not load_scan_dependencies():
+        return subnets
+    for iface in netifaces.interfaces():
+        for addr in netifaces.ifaddresses(iface).get(netifaces.AF_INET, []):
+            ip = addr.get('addr')
+            if not ip or ip.startswith("127.") or ip.startswith("169.254."):
+                continue
+            net = str(ipaddress.ip_network(f"{ip}/24", strict=False))
+            if net not in subnets:
+                subnets.append(net)
+    return subnets
+
+
 class DeviceScanner(threading.Thread):
-    def __init__(self, onvif_user, onvif_pass, callback):
+    def __init__(self, onvif_user, onvif_pass, callback, on_device=None, max_workers=8, device_timeout=5.0,
+                 usb_timeout=3.0, sweep_cidr=None):
         super().__init__()
         self.onvif_user = onvif_user
         self.onvif_pass = onvif_pass
         self.callback = callback
+        # 每发现一个设备 (码流) 就调用一次，便于界面边扫边显示
+        self.on_device = on_device
+        # 并发解析 ONVIF 设备的线程数，以及单台设备每次请求的超时 (秒)
+        self.max_workers = max_workers
+        self.device_timeout = device_timeout
+        # 探测本地相机的时限 (秒)，所有索引并发探测
+        self.usb_timeout = usb_timeout
+        # 主动扫描的网段 (如 192.168.1.0/24)；为空时仅在 WS-Discovery 一无所获时扫描本机所在网段
+        self.sweep_cidr = sweep_cidr
+        self.onvif_hosts = set()
         self.daemon = True
         self.found_devices = []
+        self.lock = threading.Lock()
+        self.finished = False  # 结果已交给 callback，之后到达的结果一律丢弃
+
+    def add_device(self, device, expired=None):
+        """记录一个设备；expired 为已超时放弃的那批请求的标记，超时后才返回的结果不再记录"""
+        with self.lock:
+            if self.finished or (expired is not None and expired.is_set()):
+                return
+            self.found_devices.append(device)
+        if self.on_device:
+            self.on_device(device)
 
     def run(self):
         print("--- 开始设备扫描 ---")
 
+        start = time.perf_counter()
         # 1. 扫描本地 USB 相机
-        self.scan_usb_cameras()
+        with _scan_timer('usb'):
+            self.scan_usb_cameras()
 
         # 2. 扫描 ONVIF 网络相机
-        if SCAN_DEPENDENCIES_OK:
-            self.scan_onvif_cameras()
+        if load_scan_dependencies():
+            with _scan_timer('onvif'):
+                self.scan_onvif_cameras()
+            # 2.1 主动网段扫描，补充 WS-Discovery 找不到的设备
+            with _scan_timer('sweep'):
+                self.scan_subnets()
         else:
-            self.found_devices.append({"label": "[错误] 缺少扫描库", "value": "0"})
+            self.add_device({"label": "[错误] 缺少扫描库", "value": "0"})
+        elapsed = time.perf_counter() - start
+        metrics.histogram('scan_total_seconds', '一次完整设备扫描的耗时 (秒)', metrics.SECONDS_BUCKETS).observe(elapsed)
 
-        # 3. 完成
+        # 3. 完成: 超时放弃的请求仍在后台线程中运行，交出的是加锁复制的列表
+        with self.lock:
+            self.finished = True
+            devices = list(self.found_devices)
         if self.callback:
-            self.callback(self.found_devices)
-        print("--- 扫描结束 ---")
+            self.callback(devices)
+        print(f"--- 扫描结束 ({elapsed:.1f} 秒) ---")
 
     def scan_usb_cameras(self):
-        # 简单扫描前10个索引
-        for i in range(10):
-            try:
-                # 尝试打开相机
-                cap = cv2.VideoCapture(i, cv2.CAP_DSHOW)
-                if not cap.isOpened():
-                    cap = cv2.VideoCapture(i)
+        # 简单扫描前10个索引；Linux 下先用 V4L2 能力信息过滤掉不存在或不能采集的节点
+        names = query_v4l2_capture_devices(10)
+        indexes = sorted(names) if names is not None else list(range(10))
+        if not indexes:
+            return
+
+        # 各索引并发探测，空索引打开超时不会拖住整个扫描
+        executor = ThreadPoolExecutor(max_workers=len(indexes))
+        futures = {i: executor.submit(self.probe_usb_camera, i) for i in indexes}
+        wait(futures.values(), timeout=self.usb_timeout)
+        executor.shutdown(wait=False, cancel_futures=True)
 
+        for i in indexes:
+            future = futures[i]
+            if not future.done() or future.cancelled() or future.exception() is not None:
+                continue
+            if future.result():
+                # 本地相机显示格式
+                label = f"[本地USB] Camera ID: {i}"
+                if names and names.get(i):
+                    label += f" ({names[i]})"
+                self.add_device({"label": label, "value": str(i)})
+
+    def probe_usb_camera(self, index):
+        if sys.platform.startswith("win"):
+            backends = [cv2.CAP_DSHOW, cv2.CAP_ANY]
+        elif sys.platform.startswith("linux"):
+            backends = [cv2.CAP_V4L2, cv2.CAP_ANY]
+        else:
+            backends = [cv2.CAP_ANY]
+
+        for backend in backends:
+            # 尝试打开相机
+            cap = cv2.VideoCapture(index, backend)
+            try:
                 if cap.isOpened():
                     ret, _ = cap.read()
-                    if ret:
-                        # 本地相机显示格式
-                        label = f"[本地USB] Camera ID: {i}"
-                        self.found_devices.append({"label": label, "value": str(i)})
-                    cap.release()
-            except:
-                pass
+                    return ret
+            finally:
+                cap.release()
+        return False
 
     def scan_onvif_cameras(self):
-        if not SCAN_DEPENDENCIES_OK: return
+        if not load_scan_dependencies(): return
 
         try:
             wsd = WSDiscovery()
@@ -75,6 +377,7 @@ class DeviceScanner(threading.Thread):
             services = wsd.searchServices()
 
             unique_ips = set()
+            targets = []
 
             for service in services:
                 try:
@@ -85,20 +388,85 @@ class DeviceScanner(threading.Thread):
                     if ip in unique_ips:
                         continue
                     unique_ips.add(ip)
+                    self.onvif_hosts.add(ip)
 
                     print(f"发现 ONVIF 设备: {ip}:{port}，尝试获取流地址...")
-                    self.get_stream_uri(ip, port)
+                    targets.append((ip, port))
 
                 except Exception as e:
                     print(f"解析服务出错: {e}")
 
             wsd.stop()
+            self.resolve_devices(targets)
         except Exception as e:
             print(f"ONVIF 扫描过程出错: {e}")
 
-    def get_stream_uri(self, ip, port):
+    def scan_subnets(self):
+        if self.sweep_cidr:
+            subnets = [c.strip() for c in self.sweep_cidr.split(',') if c.strip()]
+        elif not self.onvif_hosts:
+            subnets = local_subnets()
+        else:
+            return
+
+        targets = []
+        rtsp_only = []
+        for cidr in subnets:
+            print(f"主动扫描网段 {cidr} ...")
+            try:
+                found = sweep_subnet(cidr)
+            except Exception as e:
+                print(f"网段扫描出错 {cidr}: {e}")
+                continue
+            onvif = {}
+            for ip, port, kind in found:
+                if kind == "onvif":
+                    onvif.setdefault(ip, port)
+            for ip, port in onvif.items():
+                if ip not in self.onvif_hosts:
+                    self.onvif_hosts.add(ip)
+                    print(f"发现 ONVIF 设备: {ip}:{port} (网段扫描)，尝试获取流地址...")
+                    targets.append((ip, port))
+            for ip, port, kind in found:
+                if kind == "rtsp" and ip not in onvif and ip not in self.onvif_hosts:
+                    rtsp_only.append((ip, port))
+
+        self.resolve_devices(targets)
+        # 只有 RTSP 没有 ONVIF 的设备无法获取具体路径，给出基础地址供手动补全
+        for ip, port in rtsp_only:
+            url = inject_credentials(f"rtsp://{ip}:{port}/", self.onvif_user, self.onvif_pass)
+            self.add_device({"label": f"[RTSP] {ip}:{port}", "value": url, "host": ip})
+
+    def resolve_devices(self, targets):
+        """并发获取各设备的码流地址，单台设备无响应不会拖慢其他设备"""
+        if not targets:
+            return
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets)))
+        expired = threading.Event()
+        futures = [executor.submit(self.get_stream_uri, ip, port, expired) for ip, port in targets]
+        # 每台设备最多几次往返 (连接、GetProfiles、逐个 GetStreamUri)，按批次估算总时限
+        batches = (len(targets) + self.max_workers - 1) // self.max_workers
+        done, not_done = wait(futures, timeout=self.device_timeout * 4 * batches)
+        if not_done:
+            # 线程无法中止，只能让它们之后的结果被 add_device 忽略
+            expired.set()
+            print(f"{len(not_done)} 台设备响应超时，已跳过")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stream_uri(self, ip, port, expired=None):
         try:
-            mycam = ONVIFCamera(ip, port, self.onvif_user, self.onvif_pass)
+            transport = Transport(timeout=self.device_timeout, operation_timeout=self.device_timeout)
+            mycam = ONVIFCamera(ip, port, self.onvif_user, self.onvif_pass, transport=transport)
+
+            # 设备序列号用于缓存和查找该相机的标定参数
+            serial, model = None, None
+            try:
+                info = mycam.devicemgmt.GetDeviceInformation()
+                serial = info.SerialNumber
+                model = f"{info.Manufacturer} {info.Model}".strip()
+            except Exception as e:
+                print(f"  -> {ip} 获取设备信息失败: {e}")
+
             media = mycam.create_media_service()
             profiles = media.GetProfiles()
 
@@ -113,17 +481,23 @@ class DeviceScanner(threading.Thread):
                 rtsp_url = res.Uri
 
                 # 自动注入账号密码 (用于连接，不用于显示)
-                if self.onvif_user and self.onvif_pass and "@" not in rtsp_url:
-                    parts = rtsp_url.split("://")
-                    if len(parts) == 2:
-                        rtsp_url = f"{parts[0]}://{self.onvif_user}:{self.onvif_pass}@{parts[1]}"
+                rtsp_url = inject_credentials(rtsp_url, self.onvif_user, self.onvif_pass)
 
                 # --- 修改处：只显示 [码流名] IP ---
                 # 例如: [MainStream] 192.168.1.88
                 label = f"[{profile.Name}] {ip}"
 
+                # 分辨率用于区分主/子码流 (子码流预览、主码流截图)
+                resolution = None
+                try:
+                    res_cfg = profile.VideoEncoderConfiguration.Resolution
+                    resolution = (int(res_cfg.Width), int(res_cfg.Height))
+                except Exception:
+                    pass
+
                 # value 必须是 rtsp_url，否则无法连接
-                self.found_devices.append({"label": label, "value": rtsp_url})
+                self.add_device({"label": label, "value": rtsp_url, "host": ip, "profile": profile.Name,
+                                 "resolution": resolution, "serial": serial, "model": model}, expired)
                 print(f"  -> {label}")
 
         except Exception as e:
@@ -0,0 +1,79 @@
+import os
+import glob
+import queue
+import threading
+import cv2
+
+SNAPSHOT_EXTENSIONS = ('.jpg', '.png')
+
+
+def snapshot_name(index, fmt='jpg'):
+    return f"chess_{index:02d}.{fmt}"
+
+
+def list_snapshots(save_dir):
+    files = []
+    for ext in SNAPSHOT_EXTENSIONS:
+        files.extend(glob.glob(os.path.join(save_dir, f"chess_*{ext}")))
+    return files
+
+
+def next_snapshot_index(save_dir):
+    """目录中已有截图 (jpg/png) 的最大序号加一"""
+    max_idx = -1
+    for f in list_snapshots(save_dir):
+        part = os.path.splitext(os.path.basename(f))[0].replace("chess_", "")
+        if part.isdigit():
+            max_idx = max(max_idx, int(part))
+    return max_idx + 1
+
+
+class SnapshotWriter(threading.Thread):
+    """后台编码并写入截图，界面线程只负责分配序号和入队
+
+    fmt 为 'jpg' 或 'png' (无损)；jpeg_quality 仅对 jpg 有效。
+    """
+
+    def __init__(self, fmt='jpg', jpeg_quality=95, on_saved=None):
+        super().__init__()
+        self.daemon = True
+        self.fmt = fmt
+        self.jpeg_quality = jpeg_quality
+        self.on_saved = on_saved  # (路径, 是否成功)，在写入线程中调用
+        self.queue = queue.Queue()
+
+    def encode_params(self, fmt):
+        if fmt == 'png':
+            # 压缩级别只影响速度和文件大小，PNG 始终无损
+            return [cv2.IMWRITE_PNG_COMPRESSION, 1]
+        return [cv2.IMWRITE_JPEG_QUALITY, int(self.jpeg_quality)]
+
+    def submit(self, frame, save_dir, index):
+        """复制帧并入队，返回将要写入的文件名"""
+        file_name = snapshot_name(index, self.fmt)
+        # 帧可能来自共享内存或被采集线程复用，入队前先复制
+        self.queue.put((frame.copy(), os.path.join(save_dir, file_name), self.fmt))
+        return file_name
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            frame, path, fmt = item
+            try:
+                ok = cv2.imwrite(path, frame, self.encode_params(fmt))
+            except Exception as e:
+                print(f"截图写入失败 {path}: {e}")
+                ok = False
+            if self.on_saved:
+                self.on_saved(path, ok)
+            self.queue.task_done()
+
+    def flush(self):
+        """等待队列中的截图全部写完"""
+        self.queue.join()
+
+    def stop(self):
+        self.queue.put(None)
@@ -0,0 +1,133 @@
+import cv2 as cv
+import numpy as np
+
+# 合成棋盘格图像: 由已知内参、畸变和位姿渲染，用于基准测试和精度校验
+
+RESOLUTIONS = {
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+TRUE_DIST = np.array([[-0.28, 0.09, 0.0006, -0.0004, 0.0]])  # 广角监控镜头常见的桶形畸变
+
+
+def true_camera_matrix(image_size, fov_scale=0.8):
+    """按分辨率生成真值内参，fx = fy = fov_scale * 宽度，主点略偏离中心"""
+    w, h = image_size
+    f = fov_scale * w
+    return np.array([[f, 0, w / 2.0 + 0.01 * w], [0, f, h / 2.0 - 0.008 * h], [0, 0, 1]], np.float64)
+
+
+def board_texture(pattern_size, px_per_square=64):
+    """棋盘格纹理 (灰度)，外圈留一格白边；返回 (纹理, 第一个内角点在纹理中的坐标)"""
+    cols, rows = pattern_size[0] + 1, pattern_size[1] + 1
+    s = px_per_square
+    tex = np.full(((rows + 2) * s, (cols + 2) * s), 255, np.uint8)
+    for r in range(rows):
+        for c in range(cols):
+            if (r + c) % 2 == 0:
+                tex[(r + 1) * s:(r + 2) * s, (c + 1) * s:(c + 2) * s] = 0
+    # 像素中心坐标系下，第一个内角点位于两格交界处
+    return tex, 2 * s - 0.5
+
+
+def random_poses(count, pattern_size, square_size, image_size, matrix, seed=0):
+    """随机生成 count 个整块棋盘格 (含白边) 都在画面内的位姿 [(rvec, tvec)]"""
+    rng = np.random.default_rng(seed)
+    w, h = image_size
+    cols, rows = pattern_size
+    center = np.array([(cols - 1) * square_size / 2.0, (rows - 1) * square_size / 2.0, 0])
+    # 含白边的外框
+    outline = np.array([[-2, -2, 0], [cols + 1, -2, 0], [cols + 1, rows + 1, 0], [-2, rows + 1, 0]],
+                       np.float64) * square_size
+    board_w = (cols + 3) * square_size
+    poses = []
+    while len(poses) < count:
+        rvec = np.array([rng.uniform(-0.6, 0.6), rng.uniform(-0.6, 0.6), rng.uniform(-0.35, 0.35)])
+        fill = rng.uniform(0.3, 0.6)  # 棋盘格宽度占画面宽度的比例
+        z = matrix[0, 0] * board_w / (fill * w)
+        target = np.array([rng.uniform(0.15, 0.85) * w, rng.uniform(0.15, 0.85) * h])
+        ray = np.linalg.solve(matrix, np.array([target[0], target[1], 1.0]))
+        R, _ = cv.Rodrigues(rvec)
+        tvec = z * ray - R @ center
+        pts, _ = cv.projectPoints(outline, rvec, tvec, matrix, TRUE_DIST)
+        pts = pts.reshape(-1, 2)
+        cam = (R @ outline.T).T + tvec
+        if (cam[:, 2] > 0).all() and (pts >= 2).all() and (pts[:, 0] < w - 2).all() and (pts[:, 1] < h - 2).all():
+            poses.append((rvec, tvec))
+    return poses
+
+
+class ChessboardRenderer(object):
+    """按给定内参和畸变渲染棋盘格视图
+
+    先按理想针孔模型把纹理透视变换到带边距的画布上，再用一次 remap 加上镜头畸变；
+    畸变映射只与分辨率和内参有关，每种分辨率只计算一次。
+    """
+
+    def __init__(self, image_size, matrix, dist, pattern_size, square_size, px_per_square=64):
+        super(ChessboardRenderer, self).__init__()
+        self.image_size = image_size
+        self.matrix = matrix
+        self.dist = dist
+        self.pattern_size = pattern_size
+        self.square_size = square_size
+        self.texture, self.origin = board_texture(pattern_size, px_per_square)
+        self.px_per_square = px_per_square
+
+        # 每个输出 (畸变) 像素对应的理想像素坐标
+        w, h = image_size
+        grid = np.mgrid[0:h, 0:w][::-1].reshape(2, -1).T.astype(np.float32).reshape(-1, 1, 2)
+        criteria = (cv.TERM_CRITERIA_COUNT + cv.TERM_CRITERIA_EPS, 20, 1e-8)
+        if hasattr(cv, 'undistortPointsIter'):
+            ideal = cv.undistortPointsIter(grid, matrix, dist, None, matrix, criteria)
+        else:
+            # OpenCV 5 把迭代条件合并进了 undistortPoints
+            ideal = cv.undistortPoints(grid, matrix, dist, R=None, P=matrix, criteria=criteria)
+        ideal = ideal.reshape(h, w, 2)
+        # 桶形畸变下理想坐标会超出画面，画布四周留出足够边距
+        self.offset = np.ceil(np.maximum(0, -ideal.reshape(-1, 2).min(axis=0))).astype(int) + 2
+        self.canvas_size = (int(np.ceil(ideal[..., 0].max()) + 2 * self.offset[0]),
+                            int(np.ceil(ideal[..., 1].max()) + 2 * self.offset[1]))
+        self.map_x = (ideal[..., 0] + self.offset[0]).astype(np.float32)
+        self.map_y = (ideal[..., 1] + self.offset[1]).astype(np.float32)
+
+    def object_points(self):
+        cols, rows = self.pattern_size
+        obj = np.zeros((cols * rows, 3), np.float32)
+        obj[:, :2] = np.mgrid[0:cols, 0:rows].T.reshape(-1, 2) * self.square_size
+        return obj
+
+    def render(self, rvec, tvec, noise=2.0, blur=0.7, seed=0):
+        """渲染一张 BGR 图像，返回 (图像, 真值角点 (N, 2))"""
+        R, _ = cv.Rodrigues(rvec)
+        # 纹理像素 -> 棋盘平面 (mm) -> 理想像素 (画布坐标)
+        scale = self.square_size / float(self.px_per_square)
+        tex_to_board = np.array([[scale, 0, -self.origin * scale], [0, scale, -self.origin * scale], [0, 0, 1]])
+        board_to_image = self.matrix @ np.column_stack([R[:, 0], R[:, 1], np.ravel(tvec)])
+        shift = np.array([[1, 0, self.offset[0]], [0, 1, self.offset[1]], [0, 0, 1]], np.float64)
+        homography = shift @ board_to_image @ tex_to_board
+
+        ideal = cv.warpPerspective(self.texture, homography, self.canvas_size, flags=cv.INTER_LINEAR,
+                                   borderValue=150)
+        img = cv.remap(ideal, self.map_x, self.map_y, cv.INTER_LINEAR, borderValue=150)
+        if blur:
+            img = cv.GaussianBlur(img, (0, 0), blur)
+        if noise:
+            rng = np.random.default_rng(seed)
+            img = np.clip(img + rng.normal(0, noise, img.shape), 0, 255).astype(np.uint8)
+
+        corners, _ = cv.projectPoints(self.object_points(), rvec, tvec, self.matrix, self.dist)
+        return cv.cvtColor(img, cv.COLOR_GRAY2BGR), corners.reshape(-1, 2)
+
+
+def undistort_error(image_size, matrix, dist, true_matrix, true_dist, step=16, border=0.05):
+    """在画面内 (去掉边缘 border 比例) 按网格比较两组参数去畸变后的像素坐标，返回 (平均, 最大) 偏差"""
+    w, h = image_size
+    xs = np.arange(border * w, (1 - border) * w, step)
+    ys = np.arange(border * h, (1 - border) * h, step)
+    grid = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 1, 2).astype(np.float32)
+    ref = cv.undistortPoints(grid, true_matrix, true_dist, None, true_matrix)
+    est = cv.undistortPoints(grid, matrix, dist, None, true_matrix)
+    err = np.linalg.norm(ref - est, axis=-1).ravel()
+    return float(err.mean()), float(err.max())